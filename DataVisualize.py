@@ -1,3 +1,4 @@
+import os
 import sys
 import torch
 import numpy as np
@@ -6,12 +7,20 @@ from PySide6.QtWidgets import (
     QApplication, QMainWindow, QVBoxLayout, QPushButton, QWidget,
     QLabel, QSlider, QComboBox, QHBoxLayout, QFileDialog, QLineEdit
 )
-from PySide6.QtCore import Qt
+from PySide6.QtCore import Qt, QTimer
 from PySide6.QtGui import QIcon
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.figure import Figure
+from matplotlib.image import AxesImage
 from mpl_toolkits.axes_grid1 import make_axes_locatable
 import matplotlib.pyplot as plt
+from result_store import load_h5
+from QTTOOL import SliceThread, ExportThread
+from utils import export_diffraction_intensity
+from polarization_cache import PolarizationCache, PolarizationView
+from reduction import ReductionEngine, REDUCE_OPS
+from live_result import LiveView
+from shared_result import SharedResult, MANIFEST
 
 
 class DataVisualize(QWidget):
@@ -44,10 +53,40 @@ class DataVisualize(QWidget):
             
             self.slice_indices = [0] * (self.num_dims+1)
 
+            # 每個維度的投影方式 ("slice" 表示用 slider 取單一索引)
+            self.reduce_ops = ["slice"] * self.num_dims
+            self.reduction_engine = ReductionEngine()
+
+            # 切片與 phase 修正在背景 thread 執行，只繪製最新一筆請求
+            self.slice_request_id = 0
+            self.pending_plot_key = None
+            self.slice_thread = SliceThread(self.get_slice)
+            self.slice_thread.slice_ready.connect(self.on_slice_ready)
+            self.slice_thread.slice_failed.connect(lambda request_id, msg: print(f"切片失敗: {msg}"))
+            self.slice_thread.start()
+            # 拖曳 slider 時合併連續的 valueChanged，停頓 30 ms 後才送出請求
+            self.debounce_timer = QTimer(self)
+            self.debounce_timer.setSingleShot(True)
+            self.debounce_timer.setInterval(30)
+            self.debounce_timer.timeout.connect(self.update_plot)
+
+            # 即時檢視：定時檢查 sweep 是否有新資料，重繪頻率不超過 refresh_ms
+            self.live_version = None
+            if getattr(self, "live", None) is not None:
+                self.live_timer = QTimer(self)
+                self.live_timer.setInterval(data_sheet.get("refresh_ms", 1000))
+                self.live_timer.timeout.connect(self.refresh_live)
+                self.live_timer.start()
+
             # ========== 1. 建立 GUI 元件 ==========
             # 創建一個load npy file的按鈕
             self.load_npy_button = QPushButton("Load NPY File")
             self.load_npy_button.clicked.connect(self.openDataVisualizer)
+            # 輸出目前顯示的 Transmission 圖 (在 ExportThread 中寫檔)
+            self.export_button = QPushButton("Export Map")
+            self.export_button.clicked.connect(self.export_map)
+            self.export_thread = None
+            self.current_map = None
 
             # (A) 選擇 x、y 維度的 ComboBox
             self.combo_x_dim = QComboBox()
@@ -78,10 +117,12 @@ class DataVisualize(QWidget):
             self.ax_transmission = self.figure.add_subplot(121)  # 左子圖：Transmission
             self.ax_phase = self.figure.add_subplot(122)         # 右子圖：Phase
             self.canvas = FigureCanvas(self.figure)
+            self.canvas.mpl_connect('draw_event', self.on_canvas_draw)
 
             # (C) 建立「每個維度」對應的 Slider + Label
             self.sliders = []
             self.slider_labels = []
+            self.reduce_combos = []
 
             sliders_layout = QVBoxLayout()
             for dim in range(self.num_dims):
@@ -94,10 +135,20 @@ class DataVisualize(QWidget):
                 # 用 lambda + 預先捕捉 dim
                 slider.valueChanged.connect(lambda value, d=dim: self.update_slice(d, value))
 
+                # 投影方式：slice 或沿此維度取 max/min/mean/ptp
+                reduce_combo = QComboBox()
+                reduce_combo.addItems(["slice"] + REDUCE_OPS)
+                reduce_combo.currentIndexChanged.connect(lambda index, d=dim: self.on_reduce_changed(d))
+
                 self.sliders.append(slider)
                 self.slider_labels.append(label)
-                
-                sliders_layout.addWidget(label)
+                self.reduce_combos.append(reduce_combo)
+
+                label_layout = QHBoxLayout()
+                label_layout.addWidget(label)
+                label_layout.addStretch()
+                label_layout.addWidget(reduce_combo)
+                sliders_layout.addLayout(label_layout)
                 sliders_layout.addWidget(slider)
 
             # (D) 上方放 ComboBox (x_dim, y_dim, colormap)，下面放 sliders + 畫布
@@ -147,6 +198,7 @@ class DataVisualize(QWidget):
 
             main_layout = QVBoxLayout()
             main_layout.addWidget(self.load_npy_button)
+            main_layout.addWidget(self.export_button)
             main_layout.addLayout(combo_layout)
             main_layout.addLayout(sliders_layout)
             main_layout.addLayout(clim_layout)
@@ -170,11 +222,21 @@ class DataVisualize(QWidget):
         for dim in range(self.num_dims):
             if dim == x_dim or dim == y_dim:
                 self.sliders[dim].setDisabled(True)
+                self.reduce_combos[dim].setDisabled(True)
             else:
-                self.sliders[dim].setDisabled(False)
+                # 被投影的維度不需要 slider
+                self.sliders[dim].setDisabled(self.reduce_ops[dim] != "slice")
+                self.reduce_combos[dim].setDisabled(False)
 
         self.update_plot()
 
+    def on_reduce_changed(self, dim):
+        """
+        當某維度的投影方式 (slice/max/min/mean/ptp) 改變時，更新並重繪。
+        """
+        self.reduce_ops[dim] = self.reduce_combos[dim].currentText()
+        self.on_dim_combo_changed()
+
     def clim_changed(self):
         """
         當 x or y 維度或 colormap 被改變時，需要：
@@ -217,7 +279,7 @@ class DataVisualize(QWidget):
         """更新指定維度的 slice 索引"""
         self.slice_indices[dim] = value
         self.slider_labels[dim].setText(f"{self.dimension_names[dim]} : {self.dimension_list[dim][value]:.2f} nm, 第{value+1}/{len(self.dimension_list[dim])}筆")
-        self.update_plot()
+        self.debounce_timer.start()
 
     def chosen_polarization(self, value):
         """
@@ -233,78 +295,129 @@ class DataVisualize(QWidget):
           - 如果 x_dim == y_dim，就當作 1D 來畫線圖
           - 如果 x_dim != y_dim，就當作 2D 來用 imshow
           - 做 phase 修正 (將第一個點對齊到 0，再 mod 2π)
+        只有 x/y 維度或 colormap 改變時才重建圖，其餘只更新 artist 的資料。
+        切片在 SliceThread 中計算，結果由 on_slice_ready 繪製。
         """
-
-        # 清除舊圖
-        self.ax_transmission.clear()
-        self.ax_phase.clear()
-        
-        # 移除舊的 colorbar
-        if self.colorbar1 is not None:
-            self.colorbar1.ax.remove()
-            self.colorbar1 = None
-        if self.colorbar2 is not None:
-            self.colorbar2.ax.remove()
-            self.colorbar2 = None
-
+        self.debounce_timer.stop()
         x_dim = self.combo_x_dim.currentIndex()
         y_dim = self.combo_y_dim.currentIndex()
         colormap_name = self.combo_colormap.currentText()
 
-        # 構造 slicing
+        self.slice_request_id += 1
+        self.pending_plot_key = (x_dim, y_dim, colormap_name)
+        self.slice_thread.request(self.slice_request_id, x_dim, y_dim, list(self.slice_indices), list(self.reduce_ops))
+
+    def on_slice_ready(self, request_id):
+        """
+        背景切片完成；只處理最新的請求，過時的結果直接丟棄。
+        """
+        if request_id != self.slice_request_id:
+            return
+        result = self.slice_thread.take_result(request_id)
+        if result is None:
+            return
+        data_trans, data_phase = result
+        self.current_map = data_trans
+        plot_key = self.pending_plot_key
+        if plot_key != self.plot_key:
+            self.rebuild_plot(*plot_key, data_trans, data_phase)
+            self.plot_key = plot_key
+        else:
+            self.update_artists(data_trans, data_phase)
+
+    def get_slice(self, x_dim, y_dim, slice_indices, reduce_ops=None):
+        """
+        取得指定 slice 的 Transmission & Phase (已做 phase 修正)。
+        reduce_ops 中不是 "slice" 的維度會先以 ReductionEngine 投影。
+        1D 回傳攤平的 array；2D 會轉置成 x_dim 對應水平軸、y_dim 對應垂直軸。
+        在背景 thread 執行，不可存取 Qt 元件。
+        """
+        reduce_ops = reduce_ops or ["slice"] * self.num_dims
+        data_trans = self.project(self.data1, "amplitude", x_dim, y_dim, slice_indices, reduce_ops)
+        data_phase = self.project(self.data2, "phase", x_dim, y_dim, slice_indices, reduce_ops)
+
+        if x_dim == y_dim:
+            data_trans = data_trans.ravel()
+            data_phase = data_phase.ravel()
+
+        # 做 phase 修正：讓第一點成 0 並轉到 0~2π (相位覆蓋範圍 ptp 本身就是差值，不需修正)
+        # 即時檢視時尚未計算的點為 NaN，以第一個有效點為基準
+        # x/y 維度上殘留的 reduce 設定不會被 project 使用，只看其餘維度
+        projected = [op for d, op in enumerate(reduce_ops) if d not in (x_dim, y_dim)]
+        finite = np.isfinite(data_phase)
+        if finite.any() and "ptp" not in projected:
+            data_phase = np.mod(data_phase - data_phase[finite].flat[0], 2*np.pi)
+
+        # 若要確保 x_dim 對應水平軸、y_dim 對應垂直軸，可根據 x_dim < y_dim 來 transpose
+        if x_dim != y_dim and x_dim < y_dim:
+            data_trans = data_trans.T
+            data_phase = data_phase.T
+        return data_trans, data_phase
+
+    def project(self, source, kind, x_dim, y_dim, slice_indices, reduce_ops):
+        """
+        依序對各投影方式的維度做 chunked reduction (結果會快取)，再對其餘維度切片。
+        """
+        groups = {}
+        for dim, op in enumerate(reduce_ops):
+            if op != "slice" and dim != x_dim and dim != y_dim:
+                groups.setdefault(op, []).append(dim)
+
+        channel = slice_indices[-1]
+        # 即時檢視的資料會持續更新，快取需隨 version 失效
+        cache_key = (id(source), channel, getattr(source, "version", None))
+        for op, dims in groups.items():
+            source = self.reduction_engine.reduce(source, dims, op, kind, channel=channel, cache_key=cache_key)
+            # 第一次投影後 polarization 維度已被選定
+            cache_key = cache_key + (op, tuple(dims))
+            channel = None
+
+        # 構造 slicing (投影過的維度長度為 1)
         slicing = []
-        for dim in range(self.num_dims+1):
+        for dim in range(self.num_dims):
             if dim == x_dim or dim == y_dim:
                 slicing.append(slice(None))
+            elif reduce_ops[dim] != "slice":
+                slicing.append(0)
             else:
-                slicing.append(self.slice_indices[dim])
+                slicing.append(slice_indices[dim])
+        if channel is not None:
+            slicing.append(channel)
+
+        # 取得切片資料
+        return np.array(source[tuple(slicing)])
+
+    def rebuild_plot(self, x_dim, y_dim, colormap_name, data_trans, data_phase):
+        """
+        清除並重建兩張子圖 (x/y 維度或 colormap 改變時才需要)。
+        """
+        # 移除舊的 colorbar (需在 clear 之前，否則 colorbar 找不到 mappable 的 axes)
+        if self.colorbar1 is not None:
+            self.colorbar1.ax.remove()
+            self.colorbar1 = None
+        if self.colorbar2 is not None:
+            self.colorbar2.ax.remove()
+            self.colorbar2 = None
 
-        # 清除子圖
+        # 清除舊圖
         self.ax_transmission.clear()
         self.ax_phase.clear()
 
-        # 取得切片資料
-        data_trans = self.data1[tuple(slicing)]
-        data_phase = self.data2[tuple(slicing)]
-
         # =========== 1D / 2D 判斷 =========== #
         if x_dim == y_dim:
-            # 1D 繪圖
-            data_trans_1d = np.array(data_trans).ravel()
-            data_phase_1d = np.array(data_phase).ravel()
-
-            # 做 phase 修正：讓第一點成 0 並轉到 0~2π
-            if len(data_phase_1d) > 0:
-                data_phase_1d = np.mod(data_phase_1d - data_phase_1d[0], 2*np.pi)
-
             # 畫 Transmission
             x_data = self.dimension_list[x_dim]
-            self.ax_transmission.plot(x_data, data_trans_1d, marker='o', linestyle='-')
-            #self.ax_transmission.set_title("Transmittance (a.u.)")
+            self.artist1, = self.ax_transmission.plot(x_data, data_trans, marker='o', linestyle='-')
             self.ax_transmission.set_xlabel(self.dimension_names[x_dim])
             self.ax_transmission.set_ylabel("Transmittance (a.u.)")
             self.ax_transmission.set_ylim(self.T_clim)  # 假設在 0~1
 
             # 畫 Phase
-            self.ax_phase.plot(x_data, data_phase_1d, marker='o', linestyle='-', color='r')
-            #self.ax_phase.set_title("Phase (1D)")
+            self.artist2, = self.ax_phase.plot(x_data, data_phase, marker='o', linestyle='-', color='r')
             self.ax_phase.set_xlabel(self.dimension_names[x_dim])
             self.ax_phase.set_ylabel("Phase (rad)")
-            self.ax_phase.set_ylim(self.phase_clim) 
+            self.ax_phase.set_ylim(self.phase_clim)
         else:
-            # 2D 繪圖
-            data_trans_2d = np.array(data_trans)
-            data_phase_2d = np.array(data_phase)
-
-            # phase 修正
-            if data_phase_2d.size > 0:
-                data_phase_2d = np.mod(data_phase_2d - data_phase_2d.flat[0], 2*np.pi)
-
-            # 若要確保 x_dim 對應水平軸、y_dim 對應垂直軸，可根據 x_dim < y_dim 來 transpose
-            if x_dim < y_dim:
-                data_trans_2d = data_trans_2d.T
-                data_phase_2d = data_phase_2d.T
-            
             # x, y 軸資訊
             extent = [
                 self.dimension_list[x_dim][0],
@@ -314,8 +427,8 @@ class DataVisualize(QWidget):
             ]
 
             # Transmission
-            im1 = self.ax_transmission.imshow(
-                data_trans_2d,
+            self.artist1 = self.ax_transmission.imshow(
+                data_trans,
                 extent=extent,
                 cmap=colormap_name,
                 origin='lower',
@@ -329,11 +442,11 @@ class DataVisualize(QWidget):
             # 動態加 colorbar
             divider1 = make_axes_locatable(self.ax_transmission)
             cax1 = divider1.append_axes("right", size="5%", pad=0.05)
-            self.colorbar1 = self.figure.colorbar(im1, cax=cax1)
+            self.colorbar1 = self.figure.colorbar(self.artist1, cax=cax1)
 
             # Phase
-            im2 = self.ax_phase.imshow(
-                data_phase_2d,
+            self.artist2 = self.ax_phase.imshow(
+                data_phase,
                 extent=extent,
                 cmap=colormap_name,
                 origin='lower',
@@ -346,17 +459,74 @@ class DataVisualize(QWidget):
 
             divider2 = make_axes_locatable(self.ax_phase)
             cax2 = divider2.append_axes("right", size="5%", pad=0.05)
-            self.colorbar2 = self.figure.colorbar(im2, cax=cax2)
-
-        # Figure 大標題顯示 slice 狀態
-        """ self.figure.suptitle(
-            [f"{self.dimension_names[d][:-5]}={self.dimension_list[d][i]} nm" for d, i in enumerate(self.slice_indices)
-             if d != x_dim and d != y_dim],
-            fontsize=10
-        ) """
-        # 重繪
+            self.colorbar2 = self.figure.colorbar(self.artist2, cax=cax2)
+
+        # 資料 artist 改由 blit 繪製，背景在 draw_event 中擷取
+        self.artist1.set_animated(True)
+        self.artist2.set_animated(True)
+        self.plot_clim = (tuple(self.T_clim), tuple(self.phase_clim))
         self.canvas.draw()
 
+    def update_artists(self, data_trans, data_phase):
+        """
+        只更新 artist 資料；clim 沒變時用 blit 重繪資料，否則整張重畫 (colorbar 需更新)。
+        """
+        if isinstance(self.artist1, AxesImage):
+            self.artist1.set_data(data_trans)
+            self.artist2.set_data(data_phase)
+        else:
+            self.artist1.set_ydata(data_trans)
+            self.artist2.set_ydata(data_phase)
+
+        plot_clim = (tuple(self.T_clim), tuple(self.phase_clim))
+        if plot_clim != self.plot_clim:
+            if isinstance(self.artist1, AxesImage):
+                self.artist1.set_clim(*self.T_clim)
+                self.artist2.set_clim(*self.phase_clim)
+            else:
+                self.ax_transmission.set_ylim(self.T_clim)
+                self.ax_phase.set_ylim(self.phase_clim)
+            self.plot_clim = plot_clim
+            self.canvas.draw_idle()
+        elif self.background is None:
+            self.canvas.draw_idle()
+        else:
+            self.canvas.restore_region(self.background)
+            self.draw_animated()
+            self.canvas.blit(self.figure.bbox)
+
+    def draw_animated(self):
+        self.ax_transmission.draw_artist(self.artist1)
+        self.ax_phase.draw_artist(self.artist2)
+
+    def on_canvas_draw(self, event):
+        """
+        每次完整重繪 (含視窗縮放) 後擷取不含資料的背景，再把資料畫上去。
+        """
+        if self.artist1 is None:
+            return
+        self.background = self.canvas.copy_from_bbox(self.figure.bbox)
+        self.draw_animated()
+
+    def refresh_live(self):
+        """
+        讀取 sweep 新完成的點；有變動才重繪，sweep 結束後停止計時器。
+        """
+        self.live.refresh()
+        if self.live.version != self.live_version:
+            self.live_version = self.live.version
+            done, total = self.live.progress()
+            self.setWindowTitle(f"Data Visualizer (live {done}/{total})")
+            self.update_plot()
+        if self.live.finished:
+            self.live_timer.stop()
+            self.setWindowTitle("Data Visualizer")
+
+    def closeEvent(self, event):
+        if hasattr(self, "slice_thread"):
+            self.slice_thread.stop()
+        super().closeEvent(event)
+
     def parseDataSheet(self, data_sheet):
         """
         依照 shape_type（rectangle, ellipse, circle）解析維度資訊。
@@ -438,8 +608,23 @@ class DataVisualize(QWidget):
             raise ValueError(f"shape_type not recognized: {shape_type}")
         
         # 取出傳輸與相位資料
-        self.data1 = data_sheet["transmission_tensor"]
-        self.data2 = data_sheet["phase_tensor"]
+        if "live" in data_sheet:
+            # 執行中的 sweep：只計算切片範圍，未完成的點以 NaN 遮罩
+            self.live = data_sheet["live"]
+            self.data1 = LiveView(self.live, "amplitude", shape_type, order_index=data_sheet.get("order_index", 0))
+            self.data2 = LiveView(self.live, "phase", shape_type, order_index=data_sheet.get("order_index", 0))
+        elif "jones" in data_sheet:
+            # 直接使用複數 Jones 結果，|t|^2 與 arg(t) 依 polarization 需要時才計算並快取
+            self.polarization_cache = PolarizationCache(
+                data_sheet["jones"], shape_type,
+                order_index=data_sheet.get("order_index", 0),
+                max_bytes=data_sheet.get("cache_bytes", 512 << 20)
+            )
+            self.data1 = PolarizationView(self.polarization_cache, "amplitude")
+            self.data2 = PolarizationView(self.polarization_cache, "phase")
+        else:
+            self.data1 = data_sheet["transmission_tensor"]
+            self.data2 = data_sheet["phase_tensor"]
         
         # 儲存維度資訊
         self.dimension_names = dimension_names
@@ -452,20 +637,37 @@ class DataVisualize(QWidget):
         # colorbar 參考
         self.colorbar1 = None
         self.colorbar2 = None
+        # 持續使用的 artist 與 blit 背景，(x_dim, y_dim, colormap) 改變時才重建
+        self.artist1 = None
+        self.artist2 = None
+        self.plot_key = None
+        self.plot_clim = None
+        self.background = None
 
     def load_npy_file(self):
         """
-        讓使用者選擇 .npy 檔，讀取後嘗試解析成 data_sheet，
+        讓使用者選擇 .h5 / .npy 檔，讀取後嘗試解析成 data_sheet，
         並從其中取出 transmission_tensor、phase_tensor。
+        .h5 檔的張量維持 lazy，只有顯示的切片會從硬碟讀取。
+        manifest.json 為 SharedResult 的共享結果，直接映射 sweep 寫入的記憶體。
         """
         filename, _ = QFileDialog.getOpenFileName(
-            self, "選擇 NPY 檔案", "", "NPY Files (*.npy)"
+            self, "選擇結果檔案", "",
+            "Result Files (*.h5 *.npy manifest.json);;HDF5 Files (*.h5);;NPY Files (*.npy);;Shared Result (manifest.json)"
         )
         if not filename:
             return  # 使用者取消
 
         try:
-            data = np.load(filename, allow_pickle=True).item()
+            if os.path.basename(filename) == MANIFEST:
+                # 保留參照，memmap 在視窗存在期間維持映射
+                self.result_file = SharedResult.open(filename)
+                return self.result_file.data_sheet()
+            if filename.lower().endswith((".h5", ".hdf5")):
+                # 檔案需保持開啟，切片時才會讀取資料
+                data, self.result_file = load_h5(filename)
+            else:
+                data = np.load(filename, allow_pickle=True).item()
         except Exception as e:
             print(f"讀取檔案失敗: {e}")
             return
@@ -477,6 +679,29 @@ class DataVisualize(QWidget):
         data_sheet = data["data_sheet"]
         return data_sheet
     
+    def export_map(self):
+        """
+        將目前顯示的 Transmission 圖輸出成 .xlsx / .csv / .parquet，寫檔在背景 thread 執行。
+        """
+        if self.current_map is None or np.ndim(self.current_map) != 2:
+            print("目前沒有可輸出的 2D 圖")
+            return
+        if self.export_thread is not None and self.export_thread.isRunning():
+            print("上一個輸出尚未完成")
+            return
+        filename, _ = QFileDialog.getSaveFileName(
+            self, "輸出 Transmission 圖", "",
+            "Excel Files (*.xlsx);;CSV Files (*.csv);;Parquet Files (*.parquet)"
+        )
+        if not filename:
+            return  # 使用者取消
+        self.export_thread = ExportThread(export_diffraction_intensity, np.array(self.current_map), filename)
+        self.export_thread.export_done.connect(lambda name: print(f"輸出完成: {name}"))
+        self.export_thread.export_failed.connect(lambda msg: print(f"輸出失敗: {msg}"))
+        self.export_thread.finished.connect(lambda: self.export_button.setEnabled(True))
+        self.export_button.setEnabled(False)
+        self.export_thread.start()
+
     def openDataVisualizer(self):
         """
         按下按鈕後，依照 self.data_sheet 是否為 None 來決定要怎麼開 DataVisualizer。
@@ -1,12 +1,16 @@
+import os
 import numpy as np
 import torch
 from scipy.interpolate import interp1d
 
-class Material(torch.autograd.Function):
-    @staticmethod
-    def forward(wavelength, dl = 0.005, name = 'aSiH.txt'):
-        # open material data
-        open_name = 'Materials_data/'+name
+# 已讀取的材料資料 {檔名: (修改時間, nk_data, n_interp, k_interp)}
+_NK_TABLES = {}
+
+def load_nk(name):
+    # open material data (檔案未變動時重複使用已建立的插值函數)
+    open_name = 'Materials_data/'+name
+    mtime = os.path.getmtime(open_name)
+    if name not in _NK_TABLES or _NK_TABLES[name][0] != mtime:
         f = open(open_name)
         data = f.readlines()
         f.close()
@@ -18,36 +22,41 @@ class Material(torch.autograd.Function):
 
         n_interp = interp1d(nk_data[:,0],nk_data[:,1],kind='cubic')
         k_interp = interp1d(nk_data[:,0],nk_data[:,2],kind='cubic')
+        _NK_TABLES[name] = (mtime, nk_data, n_interp, k_interp)
+    return _NK_TABLES[name][1:]
+
+def nk_at(wavelength_np, nk_data, n_interp, k_interp):
+    # 超出資料範圍時使用端點值
+    if wavelength_np < nk_data[0,0]:
+        return nk_data[0,1]+1.j*nk_data[0,2]
+    elif wavelength_np > nk_data[-1,0]:
+        return nk_data[-1,1]+1.j*nk_data[-1,2]
+    return n_interp(wavelength_np)+1.j*k_interp(wavelength_np)
+
+class Material(torch.autograd.Function):
+    '''
+        Complex refractive index n + jk interpolated from Materials_data/<name>
 
+        以 Material.apply(wavelength, dl, name) 呼叫時可對 wavelength 反向傳播，
+        dn/dλ 以 ±dl 的中央差分計算。
+    '''
+    @staticmethod
+    def forward(ctx, wavelength, dl = 0.005, name = 'aSiH.txt'):
+        nk_data, n_interp, k_interp = load_nk(name)
         wavelength_np = wavelength.detach().cpu().numpy()
 
-        if wavelength_np < nk_data[0,0]:
-            nk_value = nk_data[0,1]+1.j*nk_data[0,2]
-        elif wavelength_np > nk_data[-1,0]:
-            nk_value = nk_data[-1,1]+1.j*nk_data[-1,2]
-        else:
-            nk_value = n_interp(wavelength_np)+1.j*k_interp(wavelength_np)
-
-        if wavelength_np-dl < nk_data[0,0]:
-            nk_value_m = nk_data[0,1]+1.j*nk_data[0,2]
-        elif wavelength_np-dl > nk_data[-1,0]:
-            nk_value_m = nk_data[-1,1]+1.j*nk_data[-1,2]
-        else:
-            nk_value_m = n_interp(wavelength_np-dl)+1.j*k_interp(wavelength_np-dl)
-
-        if wavelength_np+dl < nk_data[0,0]:
-            nk_value_p = nk_data[0,1]+1.j*nk_data[0,2]
-        elif wavelength_np+dl > nk_data[-1,0]:
-            nk_value_p = nk_data[-1,1]+1.j*nk_data[-1,2]
-        else:
-            nk_value_p = n_interp(wavelength_np+dl)+1.j*k_interp(wavelength_np+dl)
-
-        #ctx.dnk_dl = (nk_value_p - nk_value_m) / (2*dl)
-        
+        nk_value = nk_at(wavelength_np, nk_data, n_interp, k_interp)
+        nk_value_m = nk_at(wavelength_np-dl, nk_data, n_interp, k_interp)
+        nk_value_p = nk_at(wavelength_np+dl, nk_data, n_interp, k_interp)
+
+        ctx.dnk_dl = (nk_value_p - nk_value_m) / (2*dl)
+        ctx.wavelength_dtype = wavelength.dtype
+
         return torch.tensor(nk_value,dtype=torch.complex128 if ((wavelength.dtype is torch.float64) or\
             (wavelength.dtype is torch.complex128)) else torch.complex64, device=wavelength.device)
 
-    """ @staticmethod
+    @staticmethod
     def backward(ctx, grad_output):
-        grad = 2*torch.real(torch.conj(grad_output)*ctx.dnk_dl)
-        return grad """
\ No newline at end of file
+        # 實數輸入、複數輸出: dL/dλ = Re(grad_output * conj(dn/dλ))
+        grad = torch.real(grad_output*np.conj(ctx.dnk_dl)).to(ctx.wavelength_dtype)
+        return grad, None, None
@@ -2,6 +2,7 @@ from PySide6.QtWidgets import  QWidget, QWidget, QVBoxLayout
 from PySide6.QtCore import Qt, Signal, QObject, QThread
 from PySide6.QtGui import QIcon
 import logging
+import threading
 import traceback
 import sys
 from RCWA import RCWA
@@ -95,6 +96,84 @@ class SimDOEThread(QThread):
         sys.stdout = sys.__stdout__
         sys.stderr = sys.__stderr__
 
+class SliceThread(QThread):
+    """
+    在背景執行切片計算，只處理最新的一筆請求 (舊的未處理請求直接被覆蓋)。
+    slice_func(*args) 完成後發出 slice_ready(request_id)，GUI thread 再以 take_result 取回結果
+    (numpy array 不經過 Qt 的 queued signal 傳遞)。
+    """
+    slice_ready = Signal(int)
+    slice_failed = Signal(int, str)
+
+    def __init__(self, slice_func):
+        super().__init__()
+        self.slice_func = slice_func
+        self._request = None
+        self._result = None
+        self._stopped = False
+        self._condition = threading.Condition()
+
+    def request(self, request_id, *args):
+        with self._condition:
+            self._request = (request_id, args)
+            self._condition.notify()
+
+    def take_result(self, request_id):
+        """
+        取回 request_id 的結果；若已被更新的結果取代則回傳 None。
+        """
+        with self._condition:
+            if self._result is None or self._result[0] != request_id:
+                return None
+            result = self._result[1]
+            self._result = None
+            return result
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        self.wait()
+
+    def run(self):
+        while True:
+            with self._condition:
+                while self._request is None and not self._stopped:
+                    self._condition.wait()
+                if self._stopped:
+                    return
+                request_id, args = self._request
+                self._request = None
+            try:
+                result = self.slice_func(*args)
+                with self._condition:
+                    self._result = (request_id, result)
+                self.slice_ready.emit(request_id)
+            except Exception:
+                self.slice_failed.emit(request_id, traceback.format_exc())
+
+class ExportThread(QThread):
+    """
+    在背景執行檔案輸出 (例如 utils.export_diffraction_intensity)，避免大型陣列卡住 GUI。
+    export_func(data, filename, **kwargs) 完成後發出 export_done(filename)，失敗時發出 export_failed(traceback)。
+    """
+    export_done = Signal(str)
+    export_failed = Signal(str)
+
+    def __init__(self, export_func, data, filename, **kwargs):
+        super().__init__()
+        self.export_func = export_func
+        self.data = data
+        self.filename = filename
+        self.kwargs = kwargs
+
+    def run(self):
+        try:
+            self.export_func(self.data, self.filename, **self.kwargs)
+            self.export_done.emit(self.filename)
+        except Exception:
+            self.export_failed.emit(traceback.format_exc())
+
 class PlotWindow(QWidget):
     """獨立新視窗用於顯示 Matplotlib 圖"""
     def __init__(self, Mx=0, My=0, parent=None, figure=None, ax=None, name="New Plot Window"):
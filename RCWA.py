@@ -1,14 +1,38 @@
 import torch
 import numpy as np  
-import torcwa
 import random
 import os
-from Materials import Material
-from rcwa_geo import geometry
+import itertools
+import time
+import autotune
+from surrogate import AXIS_NAMES
+from sweep_planner import plan_sweep
+from channels import ChannelSelection, FORWARD_CHANNELS, PORTS, LINEAR
+from jones import JonesTensor, LINEAR_INDEX
+from field_map import FieldMapWriter, field_cross_section
+from multilayer import StackSolver, swept_layer
+from result_cache import ResultCache, file_digest, point_key
 
-GRID_XPIXELS = 300
-GRID_YPIXELS = 300
-EDGE_SHARPNESS = 1000
+# 幾何網格：卷積矩陣需要 ±2*order 的 Fourier 係數 (共 4*order+1 個)，像素數取 GRID_OVERSAMPLE*(4*order+1)，
+# 即 4*order 次諧波的每個週期 GRID_OVERSAMPLE 個像素，再加上 GRID_OVERSAMPLE 個像素的餘裕
+GRID_OVERSAMPLE = 12
+GRID_MIN_PIXELS = 64
+# None 為反鋸齒的像素面積覆蓋率 (rcwa_geo.geometry.fill)，數值為 sigmoid 邊緣銳利度
+EDGE_SHARPNESS = None
+
+def grid_pixels(harmonic_order, oversample=GRID_OVERSAMPLE):
+    """
+    由 harmonic order 決定幾何網格的像素數 (x、y 相同)，取 2^a*3^b*5^c 的 FFT 快速長度。
+    """
+    n = max(GRID_MIN_PIXELS, oversample*(4*harmonic_order + 1))
+    while True:
+        m = n
+        for p in (2, 3, 5):
+            while m % p == 0:
+                m //= p
+        if m == 1:
+            return n
+        n += 1
 
 class RCWA:
     def __init__(self, args):
@@ -35,6 +59,15 @@ class RCWA:
         else:
             self.sim_dtype = torch.complex64  # Complex number type for float32
             self.geo_dtype = torch.float32    # Geometry type for float32
+        # CPU thread 數：Auto tune 開啟時使用此主機量測過的最佳設定，尚未量測時維持 torch 預設
+        if args.get("Auto tune") == "on" and self.device.type == 'cpu':
+            setting = autotune.cached_setting(self.harmonic_order, args["Data Type"])
+            if setting is None:
+                print(f"autotune: no setting for order {self.harmonic_order} {args['Data Type']} on this host, "
+                      f"using torch defaults (run 'python autotune.py --harmonic-order {self.harmonic_order} "
+                      f"--data-type {args['Data Type']}')")
+            else:
+                torch.set_num_threads(setting["single_threads"])
         # Set random seed for reproducibility of the results
         random.seed(args["Random Seed"])  # Set seed for Python's random module
         os.environ['PYTHONHASHSEED'] = str(args["Random Seed"])  # Set seed for Python hash-based operations
@@ -43,6 +76,22 @@ class RCWA:
         if args["Device"] == "GPU":
             torch.cuda.manual_seed(args["Random Seed"])  # Set seed for CUDA (single GPU)
             torch.cuda.manual_seed_all(args["Random Seed"])  # Set seed for all GPUs (if using multiple)
+        # 幾何網格像素數 ("auto" 或未設定時依 harmonic order 決定)
+        grid = args.get("Grid pixels", "auto")
+        self.grid_pixels = grid_pixels(self.harmonic_order) if grid in (None, "", "auto") else int(grid)
+        # 幾何邊緣：None 為面積覆蓋率，inverse_design 可改為 sigmoid 銳利度以取得較平滑的梯度
+        self.edge_sharpness = EDGE_SHARPNESS
+        # Layer stack (由輸入側到輸出側)，未設定時只有原本的 Layer 1
+        self.stack = [swept_layer(args) if layer.get("swept") else layer for layer in (args.get("Stack") or [{"swept": True}])]
+        self.stack_solver = StackSolver(self.harmonic_order, self.input_material, self.output_material,
+                                        nx=self.grid_pixels, ny=self.grid_pixels, edge_sharpness=EDGE_SHARPNESS,
+                                        sim_dtype=self.sim_dtype, geo_dtype=self.geo_dtype, device=self.device,
+                                        compile_kernels=args.get("Compile kernels") == "on")
+        # Persistent result cache (空字串或未設定時停用)
+        self.result_cache = None
+        if args.get("Result cache"):
+            size_mb = args.get("Result cache size (MB)") or 2048
+            self.result_cache = ResultCache(args["Result cache"], max_bytes=int(float(size_mb)*(1 << 20)))
     def get_Sparameter(self, 
                        wvln_list=None, 
                        period_list=None,
@@ -53,103 +102,231 @@ class RCWA:
                        var2_list=None, 
                        var3_list=None, 
                        var4_list=None,
-                       orders_list=None
+                       orders_list=None,
+                       live=None,
+                       shared=None,
+                       batch_angles=False,
+                       loop_order=None,
+                       channels=None
                        ):
-        tensor_txx = torch.zeros(len(orders_list), 
-                                 len(wvln_list), 
-                                 len(period_list), 
-                                 len(thickness_list), 
-                                 len(inc_ang_list), 
-                                 len(azi_ang_list), 
-                                 len(var1_list), 
-                                 len(var2_list), 
-                                 len(var3_list), 
-                                 len(var4_list), 
-                                 len(orders_list), 
-                                 dtype=self.sim_dtype, device=self.device
-                                 )
-        tensor_txy, tensor_tyx, tensor_tyy, tensor_rxx, tensor_rxy, tensor_ryx, tensor_ryy = [torch.zeros_like(tensor_txx) for _ in range(7)]
+        """
+        batch_angles: 同一 geometry 與波長的所有 (inc, azi) 組合以 forward_angles 一次求解。
+        loop_order: 由外到內的 AXIS_NAMES 排列 (例如 plan_sweep 的 plan.order)，未給定時依原本順序。
+        channels: 選用的 channels.ChannelSelection 或 sweep spec 的 "channels" dict，
+                  只計算、配置並回傳選擇的 port / 分量 / 繞射階 (未給定時為完整輸出)。
+        live: 選用的 live_result.LiveResult，每完成一個網格點就寫入，
+              讓 DataVisualize 在 sweep 執行中即可顯示已完成的部分。
+        shared: 選用的 shared_result.SharedResult (SharedResult.for_sweep 建立)，
+                CPU 上結果直接寫入共享 buffer，DataVisualize 或其他 process 不需複製即可讀取。
+        """
+        if shared is not None:
+            sim_dtype = torch.empty((), dtype=self.sim_dtype).numpy().dtype
+            if shared.dtype != sim_dtype:
+                raise ValueError(f"shared result holds {shared.dtype} but this RCWA computes {sim_dtype}, "
+                                 f"create it with SharedResult.for_sweep(..., dtype=np.{sim_dtype})")
+        selection = ChannelSelection.from_spec(channels)
+        orders_list = selection.select_orders(orders_list)
+        extract = selection.linear()
+        if live is not None:
+            # live view 顯示穿透的四個線偏振分量
+            extract = [c for c in FORWARD_CHANNELS if c in extract or c[0] == 'T']
+        shape = (len(orders_list), len(wvln_list), len(period_list), len(thickness_list), len(inc_ang_list),
+                 len(azi_ang_list), len(var1_list), len(var2_list), len(var3_list), len(var4_list), len(orders_list))
+        # CPU 上使用 shared 時，回傳的張量與共享 buffer 為同一塊記憶體
+        use_shared = shared is not None and self.device.type == 'cpu'
+        tensors, jones = {}, {}
+        for port in PORTS:
+            keys = [key for key in LINEAR if (port, key) in extract]
+            if len(keys) == len(LINEAR):
+                # 四個線偏振分量存成一個 [..., 2, 2] Jones 張量，各分量為其 view
+                jones[port] = shared.jones(port) if use_shared else \
+                    torch.zeros(shape + (2, 2), dtype=self.sim_dtype, device=self.device)
+                tensors.update({(port, key): jones[port][..., i, j] for key, (i, j) in LINEAR_INDEX.items()})
+            else:
+                # 只配置需要的分量
+                tensors.update({(port, key): shared.tensor(port, key) if use_shared else
+                                torch.zeros(shape, dtype=self.sim_dtype, device=self.device) for key in keys})
+
+        def store(index, output):
+            # [orders, wvln, pd, thk, inc, azi, var1, var2, var3, var4]，output 中未計算的分量為 None
+            for c, value in zip(FORWARD_CHANNELS, output):
+                if c in tensors:
+                    tensors[c][(slice(None),) + index] = value #value shape is torch.size[len(orders)]
+            if live is not None:
+                live.update(index, output[:4])
+
+        if batch_angles and loop_order is not None:
+            raise ValueError("loop_order cannot be combined with batch_angles (angles are batched in a fixed order)")
         # Simulation environment
-        for wvln_idx, wvln in enumerate(wvln_list):
-            for pd_idx, pd in enumerate(period_list):
-                for thk_idx, thk in enumerate(thickness_list):
-                    for idc_idx, inc_deg in enumerate(inc_ang_list):
-                        for azi_idx, azi_deg in enumerate(azi_ang_list):
-                            for var1_idx, var1 in enumerate(var1_list):
-                                for var2_idx, var2 in enumerate(var2_list):
-                                    for var3_idx, var3 in enumerate(var3_list):
-                                        for var4_idx, var4 in enumerate(var4_list):
-                                            txx, txy, tyx, tyy, rxx, rxy, ryx, ryy = self.forward(wvln, pd, thk, inc_deg, azi_deg, var1, var2, var3, var4, orders_list)
-                                            # [orders, wvln, pd, thk, inc, azi, var1, var2, var3, var4]
-                                            tensor_txx[:, wvln_idx, pd_idx, thk_idx, idc_idx, azi_idx, var1_idx, var2_idx, var3_idx, var4_idx] = txx #txx shape is torch.size[len(orders)]
-                                            tensor_txy[:, wvln_idx, pd_idx, thk_idx, idc_idx, azi_idx, var1_idx, var2_idx, var3_idx, var4_idx] = txy
-                                            tensor_tyx[:, wvln_idx, pd_idx, thk_idx, idc_idx, azi_idx, var1_idx, var2_idx, var3_idx, var4_idx] = tyx
-                                            tensor_tyy[:, wvln_idx, pd_idx, thk_idx, idc_idx, azi_idx, var1_idx, var2_idx, var3_idx, var4_idx] = tyy
-                                            tensor_rxx[:, wvln_idx, pd_idx, thk_idx, idc_idx, azi_idx, var1_idx, var2_idx, var3_idx, var4_idx] = rxx
-                                            tensor_rxy[:, wvln_idx, pd_idx, thk_idx, idc_idx, azi_idx, var1_idx, var2_idx, var3_idx, var4_idx] = rxy
-                                            tensor_ryx[:, wvln_idx, pd_idx, thk_idx, idc_idx, azi_idx, var1_idx, var2_idx, var3_idx, var4_idx] = ryx
-                                            tensor_ryy[:, wvln_idx, pd_idx, thk_idx, idc_idx, azi_idx, var1_idx, var2_idx, var3_idx, var4_idx] = ryy
-        tensor_tRL, tensor_tRR, tensor_tLR, tensor_tLL = self.XY2RL(tensor_txx, tensor_txy, tensor_tyx, tensor_tyy)
-        tensor_rRL, tensor_rRR, tensor_rLR, tensor_rLL = self.XY2RL(tensor_rxx, tensor_rxy, tensor_ryx, tensor_ryy)
-        T = {'xx': tensor_txx, 'xy': tensor_txy, 'yx': tensor_tyx, 'yy': tensor_tyy, 'RL': tensor_tRL, 'RR': tensor_tRR, 'LR': tensor_tLR, 'LL': tensor_tLL}
-        R = {'xx': tensor_rxx, 'xy': tensor_rxy, 'yx': tensor_ryx, 'yy': tensor_ryy, 'RL': tensor_rRL, 'RR': tensor_rRR, 'LR': tensor_rLR, 'LL': tensor_rLL}
-        result = {'T': T, 'R': R}
+        if batch_angles and len(inc_ang_list)*len(azi_ang_list) > 1:
+            angle_idx = list(itertools.product(range(len(inc_ang_list)), range(len(azi_ang_list))))
+            angles = [(inc_ang_list[i], azi_ang_list[j]) for i, j in angle_idx]
+            for (wvln_idx, wvln), (pd_idx, pd), (thk_idx, thk), (var1_idx, var1), (var2_idx, var2), (var3_idx, var3), (var4_idx, var4) in \
+                    itertools.product(enumerate(wvln_list), enumerate(period_list), enumerate(thickness_list), enumerate(var1_list),
+                                      enumerate(var2_list), enumerate(var3_list), enumerate(var4_list)):
+                outputs = self.forward_angles(wvln, pd, thk, angles, var1, var2, var3, var4, orders_list, extract)
+                for (idc_idx, azi_idx), output in zip(angle_idx, outputs):
+                    store((wvln_idx, pd_idx, thk_idx, idc_idx, azi_idx, var1_idx, var2_idx, var3_idx, var4_idx), output)
+        elif loop_order is not None:
+            if sorted(loop_order) != sorted(AXIS_NAMES):
+                raise ValueError(f"loop_order must be a permutation of {AXIS_NAMES}, got {loop_order}")
+            axes = [wvln_list, period_list, thickness_list, inc_ang_list, azi_ang_list, var1_list, var2_list, var3_list, var4_list]
+            dims = [AXIS_NAMES.index(name) for name in loop_order]
+            for loop_index in itertools.product(*[range(len(axes[d])) for d in dims]):
+                index = [0]*len(axes)
+                for d, i in zip(dims, loop_index):
+                    index[d] = i
+                index = tuple(index)
+                store(index, self.forward(*[axes[d][i] for d, i in enumerate(index)], orders_list, extract))
+        else:
+            for wvln_idx, wvln in enumerate(wvln_list):
+                for pd_idx, pd in enumerate(period_list):
+                    for thk_idx, thk in enumerate(thickness_list):
+                        for idc_idx, inc_deg in enumerate(inc_ang_list):
+                            for azi_idx, azi_deg in enumerate(azi_ang_list):
+                                for var1_idx, var1 in enumerate(var1_list):
+                                    for var2_idx, var2 in enumerate(var2_list):
+                                        for var3_idx, var3 in enumerate(var3_list):
+                                            for var4_idx, var4 in enumerate(var4_list):
+                                                output = self.forward(wvln, pd, thk, inc_deg, azi_deg, var1, var2, var3, var4, orders_list, extract)
+                                                store((wvln_idx, pd_idx, thk_idx, idc_idx, azi_idx, var1_idx, var2_idx, var3_idx, var4_idx), output)
+        if live is not None:
+            live.finished = True
+        if self.result_cache is not None:
+            print(f"result cache: {self.result_cache.hits} hits, {self.result_cache.misses} misses")
+        if shared is not None:
+            if self.device.type != 'cpu':
+                # GPU 結果只在最後複製一次到共享 buffer
+                for c, tensor in tensors.items():
+                    shared.tensor(*c).copy_(tensor.detach().cpu())
+            shared.mark_complete()
+        # 圓偏振或其他基底的分量在取用時才由 Jones 張量計算 (JonesTensor.in_basis 可轉換到任意橢圓基底)
+        result = {}
+        for port in selection.ports:
+            if port in jones:
+                result[port] = JonesTensor(jones[port], keys=selection.polarizations)
+            else:
+                result[port] = {key: tensors[(port, key)] for key in selection.polarizations}
         return result
     
-    def forward(self, wvln, pd, thickness, inc_deg, azi_deg, var1, var2, var3, var4, order_list):
-        # light
-        lamb0 = torch.tensor(wvln,dtype=self.geo_dtype,device=self.device)    # nm
-        inc_ang = inc_deg*(np.pi/180)                    # radian
-        azi_ang = azi_deg*(np.pi/180)                    # radian
+    def cache_key(self, wvln, pd, thickness, inc_deg, azi_deg, var1, var2, var3, var4, order_list):
+        """
+        單一網格點的 content hash，涵蓋材料檔內容與所有影響結果的設定。
+        """
+        materials = [self.input_material, self.output_material]
+        for layer in self.stack:
+            materials += [layer[k] for k in ("material", "material_a", "material_b") if k in layer]
+        return point_key(materials=[file_digest('Materials_data/'+name) for name in materials],
+                         stack=self.stack,
+                         shape_type=self.shape_type, harmonic_order=self.harmonic_order,
+                         dtype=str(self.sim_dtype), grid=[self.grid_pixels, self.grid_pixels, self.edge_sharpness],
+                         point=[wvln, pd, thickness, inc_deg, azi_deg, var1, var2, var3, var4], orders=order_list)
+
+    def forward(self, wvln, pd, thickness, inc_deg, azi_deg, var1, var2, var3, var4, order_list, channels=None):
+        """
+        有設定 result cache 時先查詢快取，只計算沒算過的點。
+        參數為 requires_grad 的 tensor 時 (inverse_design) 不使用快取，保留計算圖。
+        channels: 要取出的 [(port, 分量), ...]，其餘輸出為 None (未給定時全部取出)。
+                  使用 result cache 時仍取出全部分量，讓快取可供任何選擇重用。
+        """
+        inputs = (wvln, pd, thickness, inc_deg, azi_deg, var1, var2, var3, var4)
+        if self.result_cache is None or any(torch.is_tensor(v) and v.requires_grad for v in inputs):
+            return self.solve(wvln, pd, thickness, inc_deg, azi_deg, var1, var2, var3, var4, order_list, channels)
+        key = self.cache_key(wvln, pd, thickness, inc_deg, azi_deg, var1, var2, var3, var4, order_list)
+        cached = self.result_cache.get(key)
+        if cached is not None:
+            return tuple(torch.as_tensor(cached[i], dtype=self.sim_dtype, device=self.device) for i in range(8))
+        outputs = self.solve(wvln, pd, thickness, inc_deg, azi_deg, var1, var2, var3, var4, order_list)
+        self.result_cache.put(key, torch.stack(outputs).detach().cpu().numpy())
+        return outputs
 
-        # material
-        input_eps = Material.forward(wavelength=lamb0, name=self.input_material)**2
-        output_eps = Material.forward(wavelength=lamb0, name=self.output_material)**2
-        layer1_epsA = Material.forward(wavelength=lamb0, name=self.layer1_materialA)**2
-        layer1_epsB = Material.forward(wavelength=lamb0, name=self.layer1_materialB)**2
-        # geometry
-        L = [pd, pd]            # nm / nm
-        pattern = geometry(Lx=L[0], Ly=L[1], nx=GRID_XPIXELS, ny=GRID_YPIXELS, edge_sharpness=EDGE_SHARPNESS, dtype=self.geo_dtype, device=self.device)
-        if self.shape_type == 'circle':
-            layer1_geometry = pattern.circle(var1,var2,L[0]/2,L[0]/2,var3)
-        elif self.shape_type == 'rectangle':
-            layer1_geometry = pattern.rectangle(var1,var2,L[0]/2,L[0]/2,var3)
-        elif self.shape_type == 'ellipse':
-            layer1_geometry = pattern.ellipse(var1,var2,L[0]/2,L[0]/2,var3)
-        elif self.shape_type == 'square':
-            layer1_geometry = pattern.square(var1,var2,L[0]/2,L[0]/2,var3)
-        elif self.shape_type == 'rhombus':
-            layer1_geometry = pattern.rhombus(var1,var2,L[0]/2,L[0]/2,var3)
-        elif self.shape_type == 'hollow_square':
-            layer1_geometry = pattern.hollow_square(var1,var2,L[0]/2,L[0]/2,var3)
-        elif self.shape_type == 'hollow_circle':
-            layer1_geometry = pattern.hollow_circle(var1,var2,L[0]/2,L[0]/2,var3)
-        elif self.shape_type == 'cross':
-            layer1_geometry = pattern.cross(var1,var2,L[0]/2,L[0]/2,var3)
-        # layers
-        # Generate and perform simulation
-        sim = torcwa.rcwa(freq=1/lamb0,order=[self.harmonic_order,self.harmonic_order],L=L,dtype=self.sim_dtype,device=self.device)
-        sim.add_input_layer(eps=input_eps)
-        sim.add_output_layer(eps=output_eps)
-        sim.set_incident_angle(inc_ang=inc_ang, azi_ang=azi_ang)
-        layer0_eps = layer1_geometry*layer1_epsA + layer1_epsB*(1.-layer1_geometry)
-        sim.add_layer(thickness=thickness,eps=layer0_eps)
-        sim.solve_global_smatrix()
+    def plan_sweep(self, wvln_list, period_list, thickness_list, inc_ang_list, azi_ang_list,
+                   var1_list, var2_list, var3_list, var4_list, memory_bytes=1 << 30):
+        """
+        依 sweep 的相依關係選擇迴圈順序，並把 StackSolver 的快取預算設為 memory_bytes。
+        回傳 sweep_planner.SweepPlan，plan.order 可傳給 get_Sparameter(loop_order=...)。
+        """
+        axes = [wvln_list, period_list, thickness_list, inc_ang_list, azi_ang_list, var1_list, var2_list, var3_list, var4_list]
+        complex_bytes = torch.empty(0, dtype=self.sim_dtype).element_size()
+        plan = plan_sweep(axes, self.harmonic_order, n_static_layers=len(self.stack) - 1, memory_bytes=memory_bytes,
+                          max_sessions=self.stack_solver.max_sessions, complex_bytes=complex_bytes)
+        self.stack_solver.cache.max_bytes = memory_bytes//2
+        self.stack_solver.modes.max_bytes = memory_bytes//2
+        print(plan.report())
+        return plan
 
-        txx = sim.S_parameters(orders=order_list, direction='forward',port='transmission',polarization='xx',ref_order=[0,0])
-        txy = sim.S_parameters(orders=order_list, direction='forward',port='transmission',polarization='xy',ref_order=[0,0])
-        tyx = sim.S_parameters(orders=order_list, direction='forward',port='transmission',polarization='yx',ref_order=[0,0])
-        tyy = sim.S_parameters(orders=order_list, direction='forward',port='transmission',polarization='yy',ref_order=[0,0])
+    def field_map(self, points, filename, plane="xz", resolution=(64, 128), position=None, margin=None,
+                  polarization="x", batch_size=16, indices=None):
+        """
+        計算選定點 (例如挑選出的 library atoms) 的 |E| / |H| 截面，每 batch_size 張寫入
+        filename (field_map.FieldMapWriter 的 chunked HDF5) 一次，記憶體只保留一個 batch。
+        points: [(wvln, pd, thickness, inc_deg, azi_deg, var1, var2, var3, var4), ...]
+        indices: 每個點的編號 (預設 0..len(points)-1)，檔案中已有的編號會略過，可中斷後續跑
+        plane / resolution / position / margin / polarization: 見 field_map.field_cross_section
+        回傳本次寫入的點數。
+        """
+        indices = list(range(len(points))) if indices is None else [int(i) for i in indices]
+        attrs = {"plane": plane, "polarization": polarization, "shape_type": self.shape_type,
+                 "harmonic_order": self.harmonic_order}
+        with FieldMapWriter(filename, resolution, attrs) as writer:
+            done = writer.done()
+            todo = [(i, p) for i, p in zip(indices, points) if i not in done]
+            start = time.time()
+            for b in range(0, len(todo), batch_size):
+                batch = {"indices": [], "points": [], "extents": [], "E": [], "H": []}
+                for index, point in todo[b:b + batch_size]:
+                    wvln, pd, thickness, inc_deg, azi_deg, var1, var2, var3, var4 = point
+                    layers = [dict(layer, thickness=thickness, vars=[var1, var2, var3, var4]) if layer.get("swept") else layer
+                              for layer in self.stack]
+                    self.stack_solver.edge_sharpness = self.edge_sharpness
+                    with torch.no_grad():
+                        sim = self.stack_solver.simulate(wvln, pd, inc_deg, azi_deg, layers)
+                        E, H, extent = field_cross_section(sim, plane, pd, [layer["thickness"] for layer in layers],
+                                                           resolution, position, margin, polarization)
+                    for key, value in zip(batch, (index, [float(v) for v in point], extent,
+                                                  E.cpu().numpy(), H.cpu().numpy())):
+                        batch[key].append(value)
+                writer.append(**batch)
+                print(f"field map: {min(b + batch_size, len(todo))}/{len(todo)} points, {time.time() - start:.1f} s")
+        return len(todo)
 
-        rxx = sim.S_parameters(orders=order_list, direction='forward',port='r',polarization='xx',ref_order=[0,0])
-        rxy = sim.S_parameters(orders=order_list, direction='forward',port='r',polarization='xy',ref_order=[0,0])
-        ryx = sim.S_parameters(orders=order_list, direction='forward',port='r',polarization='yx',ref_order=[0,0])
-        ryy = sim.S_parameters(orders=order_list, direction='forward',port='r',polarization='yy',ref_order=[0,0])
+    def forward_angles(self, wvln, pd, thickness, angles, var1, var2, var3, var4, order_list, channels=None):
+        """
+        同一 geometry 下多組 angles [(inc_deg, azi_deg), ...] 的 forward 輸出 list。
+        已在 result cache 中的角度直接取用，其餘以 StackSolver.solve_angles 一次求解。
+        """
+        outputs = [None]*len(angles)
+        keys = [None]*len(angles)
+        if self.result_cache is not None:
+            for i, (inc_deg, azi_deg) in enumerate(angles):
+                keys[i] = self.cache_key(wvln, pd, thickness, inc_deg, azi_deg, var1, var2, var3, var4, order_list)
+                cached = self.result_cache.get(keys[i])
+                if cached is not None:
+                    outputs[i] = tuple(torch.as_tensor(cached[j], dtype=self.sim_dtype, device=self.device) for j in range(8))
+        todo = [i for i, output in enumerate(outputs) if output is None]
+        if todo:
+            layers = [dict(layer, thickness=thickness, vars=[var1, var2, var3, var4]) if layer.get("swept") else layer
+                      for layer in self.stack]
+            self.stack_solver.edge_sharpness = self.edge_sharpness
+            if self.result_cache is not None:
+                channels = None
+            solved = self.stack_solver.solve_angles(wvln, pd, [angles[i] for i in todo], layers, order_list, channels)
+            for i, output in zip(todo, solved):
+                outputs[i] = output
+                if keys[i] is not None:
+                    self.result_cache.put(keys[i], torch.stack(output).detach().cpu().numpy())
+        return outputs
 
-        return txx, txy, tyx, tyy, rxx, rxy, ryx, ryy
+    def solve(self, wvln, pd, thickness, inc_deg, azi_deg, var1, var2, var3, var4, order_list, channels=None):
+        # layers: sweep 的 thickness / var1..var4 只套用在 swept 層 (原本的 Layer 1)
+        layers = [dict(layer, thickness=thickness, vars=[var1, var2, var3, var4]) if layer.get("swept") else layer
+                  for layer in self.stack]
+        self.stack_solver.edge_sharpness = self.edge_sharpness
+        return self.stack_solver.solve(wvln, pd, inc_deg, azi_deg, layers, order_list, channels)
 
     @staticmethod
     def XY2RL(txx, txy, tyx, tyy):
+        # 未歸一化的圓偏振基底 (1, ±i)：為 jones.change_basis(..., "circular") 的 2 倍
         tRL = (txx - tyy) - 1j * (txy + tyx)
         tRR = (txx + tyy) + 1j * (txy - tyx)
         tLR = (txx - tyy) + 1j * (txy + tyx)
@@ -0,0 +1,127 @@
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import platform
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+CACHE_FILE = os.path.join(os.path.expanduser("~"), ".cache", "metaatom", "autotune.json")
+# 基準測試使用的材料與形狀 (Materials_data 內建)
+BENCH_ARGS = {"Device": "CPU", "Random Seed": 0, "Shape type": "circle", "Input material": "air.txt",
+              "Output material": "air.txt", "Layer 1 material A": "aSiH.txt", "Layer 1 material B": "air.txt"}
+
+
+def host_key(harmonic_order, data_type):
+    """
+    快取 key：主機、CPU 數、torch 版本與會影響速度的模擬設定。
+    """
+    import torch
+    return f"{socket.gethostname()}|{platform.machine()}|{os.cpu_count()}|torch {torch.__version__}|" \
+           f"order {harmonic_order}|{data_type}"
+
+
+def candidates(cpu_count=None):
+    """
+    (workers, threads) 組合：threads 為 2 的次方，workers*threads 不超過 CPU 數；
+    另外包含單一 process 的各 thread 數 (RCWA.get_Sparameter 在 GUI 中使用)。
+    """
+    cpu_count = cpu_count or os.cpu_count() or 1
+    configs = []
+    threads = 1
+    while threads <= cpu_count:
+        configs += [(cpu_count//threads, threads), (1, threads)]
+        threads *= 2
+    configs.append((1, cpu_count))
+    return sorted(set(configs))
+
+
+def _init_worker(threads):
+    import torch
+    torch.set_num_threads(threads)
+
+
+def _bench_worker(harmonic_order, data_type, solves, offset):
+    from RCWA import RCWA
+    rcwa = RCWA(dict(BENCH_ARGS, **{"Harmonic order": harmonic_order, "Data Type": data_type}))
+    # 第一次求解包含初始化與材料讀取，不計時
+    rcwa.forward(600., 400., 300., 0., 0., 80., 0., 0., 0., [[0, 0]])
+    start = time.perf_counter()
+    for i in range(solves):
+        # 每次使用不同半徑，避免命中 StackSolver 的層快取
+        rcwa.forward(600., 400., 300., 0., 0., 81. + offset + i, 0., 0., 0., [[0, 0]])
+    return time.perf_counter() - start
+
+
+def benchmark(harmonic_order, data_type, workers, threads, solves=3):
+    """
+    以 workers 個 process (各 threads 個 torch thread) 同時求解，回傳每秒完成的點數。
+    """
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                             initializer=_init_worker, initargs=(threads,)) as pool:
+        start = time.perf_counter()
+        futures = [pool.submit(_bench_worker, harmonic_order, data_type, solves, 10*w) for w in range(workers)]
+        elapsed = max(f.result() for f in futures)
+        wall = time.perf_counter() - start
+    print(f"autotune: order {harmonic_order} {data_type} {workers} workers x {threads} threads: "
+          f"{workers*solves/elapsed:.2f} points/s ({wall:.1f} s)")
+    return workers*solves/elapsed
+
+
+def load_cache(filename=CACHE_FILE):
+    if not os.path.exists(filename):
+        return {}
+    with open(filename, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_cache(cache, filename=CACHE_FILE):
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    tmp = f"{filename}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(cache, f, indent=2)
+    os.replace(tmp, filename)
+
+
+def tune(harmonic_order, data_type="float32", solves=3, force=False, filename=CACHE_FILE):
+    """
+    回傳此主機在 (harmonic_order, data_type) 下最快的 {"workers", "threads", "points_per_s"}，
+    以及單一 process 時最快的 thread 數 "single_threads"。
+    結果依 host_key 快取在 filename，之後直接讀取；force=True 時重新量測。
+    """
+    key = host_key(harmonic_order, data_type)
+    cache = load_cache(filename)
+    if key in cache and not force:
+        return cache[key]
+    results = [(benchmark(harmonic_order, data_type, w, t, solves), w, t) for w, t in candidates()]
+    speed, workers, threads = max(results)
+    single_threads = max((s, t) for s, w, t in results if w == 1)[1]
+    cache = load_cache(filename)
+    cache[key] = {"workers": workers, "threads": threads, "points_per_s": speed, "single_threads": single_threads,
+                  "tuned_at": time.strftime("%Y-%m-%d %H:%M:%S")}
+    save_cache(cache, filename)
+    return cache[key]
+
+
+def cached_setting(harmonic_order, data_type="float32", filename=CACHE_FILE):
+    """
+    已量測過時回傳設定，否則回傳 None (不執行基準測試)。
+    """
+    return load_cache(filename).get(host_key(harmonic_order, data_type))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark torch threads / worker processes for RCWA on this host")
+    parser.add_argument("--harmonic-order", type=int, required=True)
+    parser.add_argument("--data-type", default="float32", choices=["float32", "float64"])
+    parser.add_argument("--solves", type=int, default=3)
+    parser.add_argument("--force", action="store_true", help="re-run even if this host is already tuned")
+    opts = parser.parse_args(argv)
+    setting = tune(opts.harmonic_order, opts.data_type, opts.solves, opts.force)
+    print(f"best: {setting['workers']} workers x {setting['threads']} threads ({setting['points_per_s']:.2f} points/s)")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+PORTS = ["T", "R"]
+LINEAR = ["xx", "xy", "yx", "yy"]
+CIRCULAR = ["RL", "RR", "LR", "LL"]
+BASES = {"linear": LINEAR, "circular": CIRCULAR, "both": LINEAR + CIRCULAR}
+# RCWA.forward 的輸出順序
+FORWARD_CHANNELS = [(port, key) for port in PORTS for key in LINEAR]
+
+
+class ChannelSelection:
+    '''
+        Output channels computed and kept by a sweep
+
+        sweep spec 的 "channels" 欄位 (皆可省略，全部省略時等同原本的完整輸出):
+        - ports: ["T", "R"] 的子集
+        - basis: "linear" / "circular" / "both"
+        - polarizations: basis 中要保留的分量，例如 ["xx", "yy"]
+        - orders: 要保留的繞射階，須為 orders_list 的子集
+
+        圓偏振分量由同一 port 的四個線偏振分量換算，所以選擇任一圓偏振分量時
+        該 port 的線偏振分量都會計算 (但只回傳選擇的分量)。
+    '''
+    def __init__(self, ports=None, basis="both", polarizations=None, orders=None):
+        if basis not in BASES:
+            raise ValueError(f"basis must be one of {list(BASES)}, got {basis!r}")
+        ports = PORTS if ports is None else list(ports)
+        unknown = [p for p in ports if p not in PORTS]
+        if unknown:
+            raise ValueError(f"unknown ports {unknown}, expected a subset of {PORTS}")
+        polarizations = BASES[basis] if polarizations is None else list(polarizations)
+        unknown = [k for k in polarizations if k not in BASES[basis]]
+        if unknown:
+            raise ValueError(f"polarizations {unknown} are not in the {basis} basis {BASES[basis]}")
+        self.basis = basis
+        self.ports = [p for p in PORTS if p in ports]
+        self.polarizations = [k for k in BASES[basis] if k in polarizations]
+        self.orders = None if orders is None else [[int(m), int(n)] for m, n in orders]
+        if not self.ports or not self.polarizations:
+            raise ValueError("channel selection is empty")
+
+    @classmethod
+    def from_spec(cls, value=None):
+        """
+        value: sweep spec 的 "channels" dict、ChannelSelection 或 None (完整輸出)。
+        """
+        if isinstance(value, cls):
+            return value
+        return cls(**(value or {}))
+
+    def to_spec(self):
+        spec = {"ports": list(self.ports), "basis": self.basis, "polarizations": list(self.polarizations)}
+        if self.orders is not None:
+            spec["orders"] = [list(o) for o in self.orders]
+        return spec
+
+    @property
+    def complete(self):
+        return self.ports == PORTS and self.polarizations == BASES["both"] and self.orders is None
+
+    def outputs(self):
+        """
+        回傳結果中保留的 (port, 分量)。
+        """
+        return [(port, key) for port in self.ports for key in self.polarizations]
+
+    def linear(self):
+        """
+        需要由 S 矩陣取出的線偏振 (port, 分量)，順序同 FORWARD_CHANNELS。
+        """
+        needed = set()
+        for port in self.ports:
+            if any(key in CIRCULAR for key in self.polarizations):
+                needed.update((port, key) for key in LINEAR)
+            needed.update((port, key) for key in self.polarizations if key in LINEAR)
+        return [c for c in FORWARD_CHANNELS if c in needed]
+
+    def select_orders(self, orders_list):
+        """
+        由 orders_list 中選出要計算的繞射階 (未指定 orders 時為全部)。
+        """
+        orders_list = [[int(m), int(n)] for m, n in orders_list]
+        if self.orders is None:
+            return orders_list
+        missing = [o for o in self.orders if o not in orders_list]
+        if missing:
+            raise ValueError(f"selected orders {missing} are not in orders_list {orders_list}")
+        return [o for o in orders_list if o in self.orders]
@@ -0,0 +1,143 @@
+import sys
+import argparse
+import numpy as np
+import torch
+
+from result_store import _require_h5py
+
+FIELD_PLANES = ["xz", "yz", "xy"]
+# 入射平面波的 [Ex, Ey] 振幅
+POLARIZATIONS = {"x": [1., 0.], "y": [0., 1.], "R": [2**-0.5, 1j*2**-0.5], "L": [2**-0.5, -1j*2**-0.5]}
+
+
+def _layer_position(thicknesses, z):
+    """
+    stack 中的絕對 z (0 為輸入側第一層的下邊界) 轉成 torcwa field_xy 的 (layer_num, z_prop)。
+    """
+    edges = np.concatenate(([0.], np.cumsum(thicknesses)))
+    if z < 0:
+        return -1, z
+    if z >= edges[-1]:
+        return len(thicknesses), z - edges[-1]
+    layer = int(np.searchsorted(edges, z, side="right")) - 1
+    return layer, z - edges[layer]
+
+
+def field_cross_section(sim, plane, pd, thicknesses, resolution, position=None, margin=None, polarization="x"):
+    """
+    已求解的 torcwa.rcwa 物件在一個截面上的 (|E|, |H|, extent)。
+
+    - plane: "xz" / "yz" (通過 position，預設為單位晶胞中心) 或 "xy" (z = position，預設為 stack 中間)
+    - resolution: (截面第一軸, 第二軸) 的取樣點數
+    - margin: xz / yz 截面在 stack 上下額外包含的距離 (預設為半個週期)
+    - extent: [a_min, a_max, b_min, b_max]，與 |E| / |H| 的兩軸對應
+    """
+    if plane not in FIELD_PLANES:
+        raise ValueError(f"plane must be one of {FIELD_PLANES}, got {plane!r}")
+    pd = float(pd)
+    total = float(sum(thicknesses))
+    sim.source_planewave(amplitude=POLARIZATIONS[polarization], direction='forward')
+    dtype = torch.float64 if sim._dtype is torch.complex128 else torch.float32
+    na, nb = resolution
+    a_axis = (pd/na)*(torch.arange(na, dtype=dtype, device=sim._device) + 0.5)
+    if plane == "xy":
+        b_axis = (pd/nb)*(torch.arange(nb, dtype=dtype, device=sim._device) + 0.5)
+        layer, z_prop = _layer_position(thicknesses, total/2 if position is None else float(position))
+        E, H = sim.field_xy(layer, a_axis, b_axis, z_prop)
+        extent = [0., pd, 0., pd]
+    else:
+        margin = pd/2 if margin is None else float(margin)
+        b_axis = torch.linspace(-margin, total + margin, nb, dtype=dtype, device=sim._device)
+        position = pd/2 if position is None else float(position)
+        E, H = sim.field_xz(a_axis, b_axis, position) if plane == "xz" else sim.field_yz(a_axis, b_axis, position)
+        extent = [0., pd, -margin, total + margin]
+    magnitude = lambda field: torch.sqrt(sum(torch.abs(c)**2 for c in field))
+    return magnitude(E), magnitude(H), extent
+
+
+class FieldMapWriter:
+    '''
+        Chunked HDF5 file that field maps are appended to batch by batch
+
+        datasets (第一維為已寫入的點數，可持續延伸):
+        - E / H: [N, na, nb] 的 |E| / |H| (float32，每張圖一個 chunk)
+        - point: [N, 9] 的 (wavelength, period, thickness, inc_ang, azi_ang, var1..var4)
+        - index: [N] 呼叫端指定的點編號 (例如 sweep 網格的攤平索引)，重新執行時略過已寫入的點
+        - extent: [N, 4] 截面兩軸的範圍
+        attrs 記錄 plane、polarization 等設定。
+    '''
+    def __init__(self, filename, resolution, attrs=None, compression="gzip"):
+        h5py = _require_h5py()
+        resolution = tuple(int(n) for n in resolution)
+        self.file = h5py.File(filename, "a")
+        if "E" in self.file:
+            if tuple(self.file["E"].shape[1:]) != resolution:
+                self.file.close()
+                raise ValueError(f"{filename} holds {tuple(self.file['E'].shape[1:])} maps, requested {resolution}")
+            # 已寫入的點以 index 略過，設定不同時不能接續寫入同一個檔案
+            for key, value in (attrs or {}).items():
+                stored = self.file.attrs.get(key)
+                if stored is None or np.asarray(stored).tolist() != np.asarray(value).tolist():
+                    self.file.close()
+                    raise ValueError(f"{filename} was written with {key}={stored!r}, requested {value!r}")
+        else:
+            for name in ("E", "H"):
+                self.file.create_dataset(name, shape=(0,) + resolution, maxshape=(None,) + resolution,
+                                         chunks=(1,) + resolution, dtype=np.float32,
+                                         compression=compression, shuffle=compression is not None)
+            self.file.create_dataset("point", shape=(0, 9), maxshape=(None, 9), dtype=np.float64)
+            self.file.create_dataset("index", shape=(0,), maxshape=(None,), dtype=np.int64)
+            self.file.create_dataset("extent", shape=(0, 4), maxshape=(None, 4), dtype=np.float64)
+            for key, value in (attrs or {}).items():
+                self.file.attrs[key] = value
+
+    def done(self):
+        return set(self.file["index"][()].tolist())
+
+    def append(self, indices, points, extents, E, H):
+        """
+        寫入一批 (len(indices) 張) field map 並 flush，已寫入的資料不會留在記憶體中。
+        """
+        start = self.file["index"].shape[0]
+        stop = start + len(indices)
+        for name, values in (("index", indices), ("point", points), ("extent", extents), ("E", E), ("H", H)):
+            dataset = self.file[name]
+            dataset.resize(stop, axis=0)
+            dataset[start:stop] = np.asarray(values, dtype=dataset.dtype)
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main(argv=None):
+    from RCWA import RCWA
+    from sweep_shard import load_spec, grid_shape, SWEEP_KEYS
+    parser = argparse.ArgumentParser(description="Stream |E| / |H| cross-sections of selected sweep points to HDF5")
+    parser.add_argument("spec")
+    parser.add_argument("--indices", type=int, nargs="+", required=True, help="flat indices into the sweep grid")
+    parser.add_argument("--out", required=True, help="output .h5 file (appended to if it exists)")
+    parser.add_argument("--plane", default="xz", choices=FIELD_PLANES)
+    parser.add_argument("--resolution", type=int, nargs=2, default=[64, 128])
+    parser.add_argument("--position", type=float, default=None)
+    parser.add_argument("--polarization", default="x", choices=list(POLARIZATIONS))
+    parser.add_argument("--batch-size", type=int, default=16)
+    opts = parser.parse_args(argv)
+
+    spec = load_spec(opts.spec)
+    shape = grid_shape(spec)
+    axes = [spec[key] for key in SWEEP_KEYS]
+    points = [[axes[d][i] for d, i in enumerate(np.unravel_index(flat, shape))] for flat in opts.indices]
+    rcwa = RCWA(spec["args"])
+    rcwa.field_map(points, opts.out, plane=opts.plane, resolution=opts.resolution, position=opts.position,
+                   polarization=opts.polarization, batch_size=opts.batch_size, indices=opts.indices)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,263 @@
+import os
+import math
+import struct
+import shutil
+import tempfile
+from datetime import datetime
+
+import numpy as np
+
+# GDSII record types (record type, data type)
+HEADER = (0x00, 0x02)
+BGNLIB = (0x01, 0x02)
+LIBNAME = (0x02, 0x06)
+UNITS = (0x03, 0x05)
+ENDLIB = (0x04, 0x00)
+BGNSTR = (0x05, 0x02)
+STRNAME = (0x06, 0x06)
+ENDSTR = (0x07, 0x00)
+BOUNDARY = (0x08, 0x00)
+SREF = (0x0A, 0x00)
+LAYER = (0x0D, 0x02)
+DATATYPE = (0x0E, 0x02)
+XY = (0x10, 0x03)
+ENDEL = (0x11, 0x00)
+SNAME = (0x12, 0x06)
+STRANS = (0x1A, 0x01)
+ANGLE = (0x1C, 0x05)
+
+# 一個 XY record 最多 8191 個點 (含封閉點)
+GDS_MAX_VERTICES = 8190
+# 各形狀實際使用的形狀參數個數 (var1 或 var1, var2)，atom key 只包含這些參數
+ATOM_PARAMS = {'circle': 1, 'square': 1, 'ellipse': 2, 'rectangle': 2, 'rhombus': 2, 'hollow_square': 2, 'cross': 2}
+
+
+def _gds_real8(value):
+    """
+    將 float 轉成 GDSII 8-byte real (excess-64, base-16)。
+    """
+    if value == 0:
+        return b"\x00" * 8
+    sign = 0x80 if value < 0 else 0x00
+    value = abs(value)
+    exponent = 64
+    while value >= 1:
+        value /= 16.
+        exponent += 1
+    while value < 1. / 16:
+        value *= 16.
+        exponent -= 1
+    mantissa = int(round(value * (1 << 56)))
+    if mantissa >= (1 << 56):
+        mantissa >>= 4
+        exponent += 1
+    return struct.pack(">B", sign | exponent) + mantissa.to_bytes(7, "big")
+
+
+def _gds_record(record, payload=b""):
+    if len(payload) % 2:
+        payload += b"\x00"
+    return struct.pack(">HBB", 4 + len(payload), record[0], record[1]) + payload
+
+
+def _gds_string(record, text):
+    return _gds_record(record, text.encode("ascii"))
+
+
+def _gds_int16(record, *values):
+    return _gds_record(record, struct.pack(f">{len(values)}h", *values))
+
+
+def _gds_timestamp():
+    now = datetime.now()
+    stamp = (now.year, now.month, now.day, now.hour, now.minute, now.second)
+    return stamp * 2
+
+
+def _rotate(points, theta):
+    c, s = math.cos(theta), math.sin(theta)
+    return np.stack([points[:, 0]*c - points[:, 1]*s, points[:, 0]*s + points[:, 1]*c], axis=1)
+
+
+def _ellipse_points(rx, ry, n_vertices):
+    phi = 2*np.pi*np.arange(n_vertices)/n_vertices
+    return np.stack([rx*np.cos(phi), ry*np.sin(phi)], axis=1)
+
+
+def _rect_points(wx, wy):
+    return np.array([[-wx/2, -wy/2], [wx/2, -wy/2], [wx/2, wy/2], [-wx/2, wy/2]])
+
+
+def _keyhole(outer, inner):
+    """
+    用切口把有洞的多邊形接成單一 boundary (GDSII 不支援 hole)。
+    outer 逆時針、inner 順時針，從兩者 x 最大的點切入。
+    """
+    i_out = int(np.argmax(outer[:, 0]))
+    i_in = int(np.argmax(inner[:, 0]))
+    outer = np.roll(outer, -i_out, axis=0)
+    inner = np.roll(inner[::-1], -(len(inner) - 1 - i_in), axis=0)
+    return np.concatenate([outer, outer[:1], inner, inner[:1]], axis=0)
+
+
+def atom_polygons(shape_type, var1, var2, theta=0., n_vertices=64):
+    """
+    依照 rcwa_geo.geometry 的形狀定義產生以原點為中心的多邊形 (nm)。
+
+    Parameters
+    - shape_type: circle / rectangle / ellipse / square / rhombus / hollow_square / cross
+      (hollow_circle 不支援：rcwa_geo.hollow_circle 內外圓都使用 R1，模擬的結構不是圓環)
+    - var1, var2: 與 geometry 相同的形狀參數
+    - theta: 旋轉角 (rad)
+    - n_vertices: 圓弧的取樣點數
+
+    Return
+    - list of (N, 2) numpy arrays
+    """
+    if shape_type == 'circle':
+        polygons = [_ellipse_points(var1, var1, n_vertices)]
+    elif shape_type == 'ellipse':
+        polygons = [_ellipse_points(var1, var2, n_vertices)]
+    elif shape_type == 'square':
+        polygons = [_rect_points(var1, var1)]
+    elif shape_type == 'rectangle':
+        polygons = [_rect_points(var1, var2)]
+    elif shape_type == 'rhombus':
+        polygons = [np.array([[var1/2, 0.], [0., var2/2], [-var1/2, 0.], [0., -var2/2]])]
+    elif shape_type == 'hollow_square':
+        polygons = [_keyhole(_rect_points(var1, var1), _rect_points(var2, var2))]
+    elif shape_type == 'cross':
+        polygons = [_rect_points(var1, var2), _rect_points(var2, var1)]
+    else:
+        raise ValueError(f"shape_type not recognized: {shape_type}")
+    if theta:
+        polygons = [_rotate(p, theta) for p in polygons]
+    return polygons
+
+
+class LayoutExporter:
+    '''
+        Streaming GDSII exporter for metasurface layouts
+
+        每個 unit cell 只需提供 (x, y, var1, var2, theta)，相同的 meta-atom
+        (量化到 database unit 後參數一致) 只會產生一次 structure，
+        其餘位置皆以 SREF 參照；旋轉角由 SREF 的 ANGLE 負責，
+        所以不同旋轉角的同一 atom 也能共用。
+
+        Top cell 的 SREF 先串流寫入暫存檔，記憶體只與 atom 種類數有關，
+        與口徑大小無關。
+
+        Parameters
+        - shape_type: 與 RCWA 的 "Shape type" 相同
+        - layer / datatype: GDSII layer 與 datatype
+        - db_unit: database unit (m)，預設 1 nm
+        - user_unit: user unit (m)，預設 1 um
+        - n_vertices: 圓形/橢圓的取樣點數
+    '''
+    def __init__(self, shape_type, layer=1, datatype=0, db_unit=1e-9, user_unit=1e-6,
+                 n_vertices=64, top_name="TOP", lib_name="METASURFACE"):
+        if shape_type not in ATOM_PARAMS:
+            raise ValueError(f"shape_type {shape_type!r} cannot be exported, expected one of {list(ATOM_PARAMS)}")
+        self.shape_type = shape_type
+        self.layer = layer
+        self.datatype = datatype
+        self.db_unit = db_unit
+        self.user_unit = user_unit
+        self.n_vertices = n_vertices
+        self.top_name = top_name
+        self.lib_name = lib_name
+        # nm -> database unit
+        self.scale = 1e-9/db_unit
+        # 旋轉對稱形狀不需要 SREF 旋轉
+        self.rotation_free = shape_type == 'circle'
+
+    def atom_key(self, var1, var2):
+        # 形狀不使用的參數固定為 0，避免同一個 atom 產生多個 structure
+        if ATOM_PARAMS[self.shape_type] == 1:
+            var2 = 0.
+        return (int(round(var1*self.scale)), int(round(var2*self.scale)))
+
+    def _boundary(self, points):
+        xy = np.round(points*self.scale).astype(np.int64)
+        xy = np.concatenate([xy, xy[:1]], axis=0)
+        if len(xy) > GDS_MAX_VERTICES + 1:
+            raise ValueError(f"polygon has {len(xy)} vertices, GDSII allows at most {GDS_MAX_VERTICES + 1}")
+        return (_gds_record(BOUNDARY) + _gds_int16(LAYER, self.layer) + _gds_int16(DATATYPE, self.datatype)
+                + _gds_record(XY, xy.astype(">i4").tobytes()) + _gds_record(ENDEL))
+
+    def _structure(self, name, key):
+        var1, var2 = key[0]/self.scale, key[1]/self.scale
+        body = b"".join(self._boundary(p) for p in atom_polygons(self.shape_type, var1, var2, 0., self.n_vertices))
+        return (_gds_int16(BGNSTR, *_gds_timestamp()) + _gds_string(STRNAME, name) + body + _gds_record(ENDSTR))
+
+    def _sref(self, name, x, y, theta):
+        record = _gds_record(SREF) + _gds_string(SNAME, name)
+        angle = math.degrees(theta) % 360.
+        if angle and not self.rotation_free:
+            record += _gds_int16(STRANS, 0) + _gds_record(ANGLE, _gds_real8(angle))
+        xy = np.array([[round(x*self.scale), round(y*self.scale)]], dtype=">i4")
+        return record + _gds_record(XY, xy.tobytes()) + _gds_record(ENDEL)
+
+    def write(self, cells, filename, buffer_size=1 << 20):
+        """
+        cells: iterable of (x, y, var1, var2, theta)，x/y/var 單位 nm，theta 單位 rad。
+        可以是 generator，不會一次全部載入記憶體。
+
+        回傳 {atom key: structure name}。
+        """
+        if filename.lower().endswith(".oas"):
+            return self.write_oasis(cells, filename)
+        atoms = {}
+        with tempfile.TemporaryFile() as top:
+            chunk = []
+            size = 0
+            for x, y, var1, var2, theta in cells:
+                key = self.atom_key(var1, var2)
+                name = atoms.get(key)
+                if name is None:
+                    name = f"ATOM_{len(atoms)}"
+                    atoms[key] = name
+                chunk.append(self._sref(name, x, y, theta))
+                size += len(chunk[-1])
+                if size >= buffer_size:
+                    top.write(b"".join(chunk))
+                    chunk, size = [], 0
+            top.write(b"".join(chunk))
+            top.seek(0)
+
+            with open(filename, "wb") as f:
+                f.write(_gds_int16(HEADER, 600))
+                f.write(_gds_int16(BGNLIB, *_gds_timestamp()))
+                f.write(_gds_string(LIBNAME, self.lib_name))
+                f.write(_gds_record(UNITS, _gds_real8(self.db_unit/self.user_unit) + _gds_real8(self.db_unit)))
+                for key, name in atoms.items():
+                    f.write(self._structure(name, key))
+                f.write(_gds_int16(BGNSTR, *_gds_timestamp()))
+                f.write(_gds_string(STRNAME, self.top_name))
+                shutil.copyfileobj(top, f, buffer_size)
+                f.write(_gds_record(ENDSTR))
+                f.write(_gds_record(ENDLIB))
+        print(f"GDSII file save as :'{filename}' ({len(atoms)} unique atoms)")
+        return atoms
+
+    def write_oasis(self, cells, filename):
+        """
+        OASIS 輸出：先串流寫成暫存的 GDSII，再交給 gdstk 轉檔 (需要安裝 gdstk)。
+        OASIS 的 repetition/CBLOCK 壓縮由 gdstk 處理。
+
+        注意：轉檔不是串流的，gdstk.read_gds 會把整個 library (含 top cell 的所有 SREF)
+        載入記憶體；大型口徑請輸出 .gds。
+        """
+        try:
+            import gdstk
+        except ImportError:
+            raise ImportError("OASIS export requires gdstk (pip install gdstk)")
+        fd, gds_name = tempfile.mkstemp(suffix=".gds")
+        os.close(fd)
+        try:
+            atoms = self.write(cells, gds_name)
+            gdstk.read_gds(gds_name).write_oas(filename)
+        finally:
+            os.remove(gds_name)
+        print(f"OASIS file save as :'{filename}'")
+        return atoms
@@ -0,0 +1,117 @@
+import time
+import warnings
+import numpy as np
+import torch
+
+# RCWA.forward 可最佳化的參數 (其餘為固定值)
+DESIGN_PARAMS = ["period", "thickness", "var1", "var2", "var3", "var4"]
+# forward 的輸出順序
+OUTPUT_INDEX = {("T", "xx"): 0, ("T", "xy"): 1, ("T", "yx"): 2, ("T", "yy"): 3,
+                ("R", "xx"): 4, ("R", "xy"): 5, ("R", "yx"): 6, ("R", "yy"): 7}
+
+
+class InverseDesign:
+    '''
+        Gradient-based meta-atom design through RCWA.forward
+
+        Parameters
+        - rcwa: RCWA 物件 (建議 Data Type 為 float64)
+        - bounds: {參數名稱: (min, max)}，參數名稱見 DESIGN_PARAMS，列出的參數即為設計變數
+        - fixed: 其他 forward 參數的固定值 {"period": ..., "thickness": ..., "inc_ang": ..., "azi_ang": ..., "var1": ...}
+        - targets: 目標列表，每個為 dict
+            wavelength, port ('T'/'R'), polarization ('xx'...), order ([m, n], 預設 [0, 0]),
+            amplitude (|t|^2 目標，可省略), phase (rad，可省略), weight (預設 1)
+        - edge_sharpness: 最佳化時使用的幾何邊緣銳利度，太銳利時梯度只存在於單一像素內
+
+        設計變數在 [0, 1] 正規化後以 Adam 更新，每步後截斷回邊界內；
+        phase 誤差以 1 - cos(Δφ) 計算，避免 ±π 跳躍。
+    '''
+    def __init__(self, rcwa, bounds, fixed=None, targets=(), edge_sharpness=50.):
+        unknown = set(bounds) - set(DESIGN_PARAMS)
+        if unknown:
+            raise ValueError(f"unknown design parameters: {sorted(unknown)}")
+        if not targets:
+            raise ValueError("at least one target is required")
+        self.rcwa = rcwa
+        self.bounds = {k: (float(lo), float(hi)) for k, (lo, hi) in bounds.items()}
+        self.fixed = {"period": 0., "thickness": 0., "inc_ang": 0., "azi_ang": 0.,
+                      "var1": 0., "var2": 0., "var3": 0., "var4": 0.}
+        self.fixed.update(fixed or {})
+        self.targets = [dict(t) for t in targets]
+        self.edge_sharpness = edge_sharpness
+        self.orders = []
+        for t in self.targets:
+            order = list(t.get("order", [0, 0]))
+            if order not in self.orders:
+                self.orders.append(order)
+
+    def _values(self, u):
+        lo = torch.tensor([self.bounds[k][0] for k in self.bounds], dtype=u.dtype, device=u.device)
+        hi = torch.tensor([self.bounds[k][1] for k in self.bounds], dtype=u.dtype, device=u.device)
+        values = dict(self.fixed)
+        values.update(zip(self.bounds, lo + (hi - lo)*u))
+        return values
+
+    def loss(self, values):
+        """
+        所有目標的加權誤差，以及每個目標目前的 (|t|^2, phase)。
+        """
+        total = 0.
+        responses = []
+        by_wavelength = {}
+        for t in self.targets:
+            by_wavelength.setdefault(float(t["wavelength"]), []).append(t)
+        for wvln, targets in by_wavelength.items():
+            outputs = self.rcwa.forward(wvln, values["period"], values["thickness"], values["inc_ang"], values["azi_ang"],
+                                        values["var1"], values["var2"], values["var3"], values["var4"], self.orders)
+            for t in targets:
+                field = outputs[OUTPUT_INDEX[(t.get("port", "T"), t.get("polarization", "xx"))]]
+                field = field[self.orders.index(list(t.get("order", [0, 0])))]
+                amplitude, phase = field.abs()**2, torch.angle(field)
+                weight = t.get("weight", 1.)
+                if t.get("amplitude") is not None:
+                    total = total + weight*(amplitude - t["amplitude"])**2
+                if t.get("phase") is not None:
+                    total = total + weight*(1. - torch.cos(phase - t["phase"]))
+                responses.append((float(amplitude), float(phase)))
+        return total, responses
+
+    def run(self, initial=None, steps=50, lr=0.05, tol=1e-6, verbose=True):
+        """
+        initial: {參數名稱: 起始值}，未給定時使用邊界中點
+        回傳 (最佳參數 dict, 最佳 loss, history)；history 每步為 (loss, 參數 dict)
+        """
+        dtype = self.rcwa.geo_dtype
+        start = [0.5]*len(self.bounds)
+        if initial is not None:
+            start = [(initial.get(k, (lo + hi)/2) - lo)/(hi - lo) for k, (lo, hi) in self.bounds.items()]
+        u = torch.tensor(start, dtype=dtype, device=self.rcwa.device).clamp(0., 1.).requires_grad_(True)
+        optimizer = torch.optim.Adam([u], lr=lr)
+
+        edge_sharpness = self.rcwa.edge_sharpness
+        self.rcwa.edge_sharpness = self.edge_sharpness
+        best = (np.inf, None)
+        history = []
+        try:
+            for step in range(steps):
+                t0 = time.time()
+                optimizer.zero_grad()
+                with warnings.catch_warnings():
+                    # torcwa 會把 tensor 週期轉成常數一次 (之後使用原 tensor，梯度不受影響)
+                    warnings.filterwarnings("ignore", message="Converting a tensor with requires_grad")
+                    loss, responses = self.loss(self._values(u))
+                    loss.backward()
+                params = {k: float(v) for k, v in self._values(u.detach()).items() if k in self.bounds}
+                history.append((float(loss), params))
+                if float(loss) < best[0]:
+                    best = (float(loss), params)
+                if verbose:
+                    print(f"step {step}: loss {float(loss):.4e} {params} ({time.time() - t0:.2f} s)")
+                if float(loss) < tol:
+                    break
+                optimizer.step()
+                with torch.no_grad():
+                    u.clamp_(0., 1.)
+        finally:
+            self.rcwa.edge_sharpness = edge_sharpness
+        return best[1], best[0], history
@@ -0,0 +1,314 @@
+import os
+import sys
+import json
+import time
+import getpass
+import heapq
+import argparse
+import threading
+import itertools
+import urllib.request
+import urllib.error
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from sweep_shard import spec_hash, load_spec
+from autotune import tune, cached_setting
+
+DEFAULT_PORT = 8765
+
+
+def _init_worker(threads):
+    import torch
+    torch.set_num_threads(threads)
+
+
+def _execute_job(spec, job_dir):
+    """
+    在 worker process 中執行整個 sweep (單一 shard)，結果存成 result.npy。
+    """
+    import numpy as np
+    from sweep_shard import run_shard, merge_shards
+    run_shard(spec, 0, 1, job_dir)
+    result = merge_shards(spec, job_dir)
+    result = {port: {k: v.numpy() for k, v in channels.items()} for port, channels in result.items()}
+    filename = os.path.join(job_dir, "result.npy")
+    # 先寫暫存檔再 rename，submit 只會看到完整的 result.npy
+    tmp = f"{filename}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        np.save(f, {"result": result, "spec": spec}, allow_pickle=True)
+    os.replace(tmp, filename)
+    return filename
+
+
+class JobQueue:
+    '''
+        Priority queue of sweep jobs executed on a fixed worker-process pool
+
+        相同 spec (spec_hash 相同) 的提交會共用同一個 job；已有 result.npy
+        的 spec 直接回報完成。priority 數字越小越先執行，同優先權依提交順序。
+
+        Parameters
+        - root: job 目錄與結果存放位置
+        - workers: worker process 數 (預設為 autotune 對 harmonic_order / data_type 量測的結果，未量測時為 1)
+        - threads: 每個 worker 的 torch thread 數 (預設同上，未量測時為 CPU 數 / workers)
+    '''
+    def __init__(self, root, workers=None, threads=None, harmonic_order=9, data_type="float32"):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        setting = cached_setting(harmonic_order, data_type) or {}
+        self.workers = workers or setting.get("workers", 1)
+        self.threads = threads or (setting["threads"] if workers is None and setting
+                                   else max(1, (os.cpu_count() or 1)//self.workers))
+        self.jobs = {}
+        self._heap = []
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._free = threading.Semaphore(self.workers)
+        self.pool = self._make_pool()
+        self._dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+        self._dispatcher.start()
+
+    def _make_pool(self):
+        self._fresh_pool = True
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"),
+                                   initializer=_init_worker, initargs=(self.threads,))
+
+    def submit(self, spec, priority=10, client=""):
+        job_id = spec_hash(spec)
+        job_dir = os.path.join(self.root, job_id)
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is not None and job["status"] not in ("failed", "cancelled"):
+                job["clients"].append(client)
+                # 重複提交時採用較高的優先權
+                if job["status"] == "queued" and priority < job["priority"]:
+                    job["priority"] = priority
+                    heapq.heappush(self._heap, (priority, next(self._counter), job_id))
+                return dict(job, duplicate=True)
+            job = {"id": job_id, "status": "queued", "priority": priority, "clients": [client],
+                   "submitted": time.time(), "started": None, "finished": None, "result": None, "error": None}
+            result_file = os.path.join(job_dir, "result.npy")
+            if os.path.exists(result_file):
+                job.update(status="done", finished=os.path.getmtime(result_file), result=result_file)
+            else:
+                os.makedirs(job_dir, exist_ok=True)
+                heapq.heappush(self._heap, (priority, next(self._counter), job_id))
+                self._wakeup.notify()
+            job["spec"] = spec
+            self.jobs[job_id] = job
+            return dict(job, duplicate=False)
+
+    def cancel(self, job_id):
+        with self._lock:
+            job = self.jobs.get(job_id)
+            if job is None or job["status"] != "queued":
+                return False
+            job["status"] = "cancelled"
+            return True
+
+    def status(self, job_id=None):
+        with self._lock:
+            if job_id is not None:
+                job = self.jobs.get(job_id)
+                return None if job is None else {k: v for k, v in job.items() if k != "spec"}
+            return [{k: v for k, v in job.items() if k != "spec"} for job in self.jobs.values()]
+
+    def _dispatch(self):
+        while True:
+            self._free.acquire()
+            with self._lock:
+                job = None
+                while job is None:
+                    while not self._heap:
+                        self._wakeup.wait()
+                    priority, _, job_id = heapq.heappop(self._heap)
+                    candidate = self.jobs[job_id]
+                    # 略過已取消或優先權已被提高 (舊的 heap entry) 的項目
+                    if candidate["status"] == "queued" and candidate["priority"] == priority:
+                        job = candidate
+                job.update(status="running", started=time.time())
+            try:
+                future = self.pool.submit(_execute_job, job["spec"], os.path.join(self.root, job["id"]))
+            except BrokenProcessPool as e:
+                # 先前的 job 讓 worker 異常結束，pool 無法再使用：換一個新的 pool，這個 job 重新排入
+                # (新 pool 仍無法接受 job 時才視為失敗，避免無限重試)
+                fresh = self._fresh_pool
+                self.pool.shutdown(wait=False, cancel_futures=True)
+                self.pool = self._make_pool()
+                with self._lock:
+                    if fresh:
+                        job.update(status="failed", finished=time.time(), error=repr(e))
+                    else:
+                        job.update(status="queued", started=None)
+                        heapq.heappush(self._heap, (job["priority"], next(self._counter), job["id"]))
+                self._free.release()
+                continue
+            except Exception as e:
+                with self._lock:
+                    job.update(status="failed", finished=time.time(), error=repr(e))
+                self._free.release()
+                continue
+            self._fresh_pool = False
+            future.add_done_callback(lambda f, job_id=job["id"]: self._finished(job_id, f))
+
+    def _finished(self, job_id, future):
+        with self._lock:
+            job = self.jobs[job_id]
+            job["finished"] = time.time()
+            try:
+                job["result"] = future.result()
+                job["status"] = "done"
+            except Exception as e:
+                job["status"] = "failed"
+                job["error"] = repr(e)
+        self._free.release()
+
+    def shutdown(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+class _JobHandler(BaseHTTPRequestHandler):
+    queue = None
+
+    def _send(self, code, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        parts = [p for p in self.path.split("/") if p]
+        if parts == ["jobs"]:
+            return self._send(200, self.queue.status())
+        if len(parts) == 2 and parts[0] == "jobs":
+            job = self.queue.status(parts[1])
+            return self._send(200, job) if job else self._send(404, {"error": "unknown job"})
+        self._send(404, {"error": "not found"})
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/jobs":
+            return self._send(404, {"error": "not found"})
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            job = self.queue.submit(request["spec"], int(request.get("priority", 10)), request.get("client", ""))
+        except (ValueError, KeyError) as e:
+            return self._send(400, {"error": repr(e)})
+        self._send(200, {k: v for k, v in job.items() if k != "spec"})
+
+    def do_DELETE(self):
+        parts = [p for p in self.path.split("/") if p]
+        if len(parts) == 2 and parts[0] == "jobs" and self.queue.cancel(parts[1]):
+            return self._send(200, {"id": parts[1], "status": "cancelled"})
+        self._send(409, {"error": "job is not queued"})
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(root, workers=None, threads=None, port=DEFAULT_PORT, harmonic_order=9, data_type="float32"):
+    """
+    在 localhost 上啟動 job server (只接受本機連線)。
+    workers / threads 未指定時使用此主機的 autotune 結果 (見 JobQueue)。
+    """
+    queue = JobQueue(root, workers, threads, harmonic_order, data_type)
+    handler = type("JobHandler", (_JobHandler,), {"queue": queue})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    print(f"job server on http://127.0.0.1:{port} ({queue.workers} workers x {queue.threads} threads, root '{root}')")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        queue.shutdown()
+
+
+class JobClient:
+    '''
+        GUI / CLI 用的 job server client
+    '''
+    def __init__(self, port=DEFAULT_PORT, client=""):
+        self.url = f"http://127.0.0.1:{port}/jobs"
+        self.client = client or f"{getpass.getuser()}:{os.getpid()}"
+
+    def _request(self, method, url, payload=None):
+        data = json.dumps(payload).encode("utf-8") if payload is not None else None
+        req = urllib.request.Request(url, data=data, method=method, headers={"Content-Type": "application/json"})
+        try:
+            with urllib.request.urlopen(req) as response:
+                return json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            raise RuntimeError(json.loads(e.read()).get("error", str(e)))
+
+    def submit(self, spec, priority=10):
+        return self._request("POST", self.url, {"spec": spec, "priority": priority, "client": self.client})
+
+    def status(self, job_id=None):
+        return self._request("GET", self.url if job_id is None else f"{self.url}/{job_id}")
+
+    def cancel(self, job_id):
+        return self._request("DELETE", f"{self.url}/{job_id}")
+
+    def wait(self, job_id, poll=2., timeout=None):
+        """
+        等待 job 結束，回傳最終狀態。
+        """
+        start = time.time()
+        while True:
+            job = self.status(job_id)
+            if job["status"] in ("done", "failed", "cancelled"):
+                return job
+            if timeout is not None and time.time() - start > timeout:
+                raise TimeoutError(f"job {job_id} still {job['status']}")
+            time.sleep(poll)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local RCWA sweep job server")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    sub = parser.add_subparsers(dest="command", required=True)
+    srv = sub.add_parser("serve")
+    srv.add_argument("--root", default="sweep_jobs")
+    srv.add_argument("--workers", default=None,
+                     help="worker process count, or 'auto' to run the autotune benchmark if this host is not tuned "
+                          "(default: cached autotune result, else 1)")
+    srv.add_argument("--threads", type=int, default=None)
+    srv.add_argument("--harmonic-order", type=int, default=9, help="harmonic order the autotune result is looked up for")
+    srv.add_argument("--data-type", default="float32", choices=["float32", "float64"])
+    sbm = sub.add_parser("submit")
+    sbm.add_argument("spec")
+    sbm.add_argument("--priority", type=int, default=10)
+    sbm.add_argument("--wait", action="store_true")
+    sts = sub.add_parser("status")
+    sts.add_argument("job_id", nargs="?")
+    cnl = sub.add_parser("cancel")
+    cnl.add_argument("job_id")
+    opts = parser.parse_args(argv)
+
+    if opts.command == "serve":
+        workers, threads = opts.workers, opts.threads
+        if workers == "auto":
+            # 此主機第一次使用時會先執行基準測試，之後讀取快取
+            setting = tune(opts.harmonic_order, opts.data_type)
+            workers, threads = setting["workers"], threads or setting["threads"]
+        return serve(opts.root, workers and int(workers), threads, opts.port, opts.harmonic_order, opts.data_type)
+    client = JobClient(opts.port)
+    if opts.command == "submit":
+        job = client.submit(load_spec(opts.spec), opts.priority)
+        if opts.wait:
+            job = client.wait(job["id"])
+    elif opts.command == "status":
+        job = client.status(opts.job_id)
+    else:
+        job = client.cancel(opts.job_id)
+    print(json.dumps(job, indent=2))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
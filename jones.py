@@ -0,0 +1,151 @@
+from collections.abc import Mapping
+import numpy as np
+
+# 線偏振分量在 Jones 矩陣中的位置 (torcwa 慣例: 輸出在前、輸入在後)
+LINEAR_INDEX = {"xx": (0, 0), "xy": (0, 1), "yx": (1, 0), "yy": (1, 1)}
+# 預設的基底 {名稱: (兩個偏振態的標籤, 以 xy 分量表示的基底向量)}
+BASES = {
+    "linear": ("xy", [[1., 0.], [0., 1.]]),
+    "circular": ("RL", [[1., 1.], [1.j, -1.j]]),
+}
+
+
+def elliptical_state(psi, chi):
+    """
+    方位角 psi、橢圓率角 chi (rad) 的歸一化 Jones 向量 [Ex, Ey]。
+    chi = 0 為線偏振，chi = ±pi/4 為圓偏振。
+    """
+    return np.array([np.cos(psi)*np.cos(chi) - 1j*np.sin(psi)*np.sin(chi),
+                     np.sin(psi)*np.cos(chi) + 1j*np.cos(psi)*np.sin(chi)])
+
+
+def basis_matrix(basis):
+    """
+    回傳 (標籤, 2x2 基底矩陣)，矩陣的兩個 column 為歸一化的基底向量 (以 xy 表示)。
+
+    basis:
+    - "linear" / "circular"
+    - (psi, chi): 橢圓偏振態與其正交態，標籤為 "ab"
+    - 2x2 array-like，column 為基底向量，標籤為 "ab"
+    """
+    if isinstance(basis, str):
+        if basis not in BASES:
+            raise ValueError(f"unknown basis {basis!r}, expected one of {list(BASES)} or (psi, chi)")
+        labels, matrix = BASES[basis]
+        matrix = np.asarray(matrix, dtype=np.complex128)
+    else:
+        labels = "ab"
+        matrix = np.asarray(basis, dtype=np.complex128)
+        if matrix.shape == (2,):
+            psi, chi = matrix.real
+            matrix = np.stack((elliptical_state(psi, chi), elliptical_state(psi + np.pi/2, -chi)), axis=1)
+        elif matrix.shape != (2, 2):
+            raise ValueError(f"basis must be a name, (psi, chi) or a 2x2 matrix, got shape {matrix.shape}")
+    matrix = matrix/np.linalg.norm(matrix, axis=0)
+    if abs(np.vdot(matrix[:, 0], matrix[:, 1])) > 1e-9:
+        raise ValueError("basis vectors must be orthogonal")
+    return labels, matrix
+
+
+def _as_operand(matrix, like):
+    if hasattr(like, "detach"):
+        import torch
+        return torch.as_tensor(matrix, dtype=like.dtype, device=like.device)
+    return matrix.astype(np.result_type(like.dtype, np.complex64), copy=False)
+
+
+def _einsum(expression, *operands):
+    if hasattr(operands[1], "detach"):
+        import torch
+        return torch.einsum(expression, *operands)
+    return np.einsum(expression, *operands)
+
+
+def stack_linear(xx, xy, yx, yy):
+    """
+    將四個線偏振分量組成 [..., 2, 2] 的 Jones 張量 (torch 或 numpy)。
+    """
+    if hasattr(xx, "detach"):
+        import torch
+        return torch.stack((torch.stack((xx, xy), -1), torch.stack((yx, yy), -1)), -2)
+    return np.stack((np.stack((xx, xy), -1), np.stack((yx, yy), -1)), -2)
+
+
+def change_basis(jones, out_basis, in_basis=None):
+    """
+    J' = B_out^H J B_in，以單一 batched einsum 轉換 [..., 2, 2] 的 Jones 張量。
+    in_basis 未給定時與 out_basis 相同。
+    """
+    _, out_matrix = basis_matrix(out_basis)
+    _, in_matrix = basis_matrix(out_basis if in_basis is None else in_basis)
+    return _einsum("ai,...ij,jb->...ab", _as_operand(out_matrix.conj().T, jones), jones, _as_operand(in_matrix, jones))
+
+
+def component(jones, out_state, in_state):
+    """
+    單一分量 u_out^H J u_in (u 為 Jones 向量)，不建立完整的轉換後張量。
+    """
+    out_state = np.asarray(out_state, dtype=np.complex128)
+    in_state = np.asarray(in_state, dtype=np.complex128)
+    return _einsum("i,...ij,j->...", _as_operand(out_state.conj(), jones), jones, _as_operand(in_state, jones))
+
+
+class JonesTensor(Mapping):
+    '''
+        Jones matrices of a sweep stored as one [..., 2, 2] tensor
+
+        以 mapping 方式使用時與原本的 {'xx': ..., 'RL': ...} 結果相容：
+        目前基底的分量 (例如 'xx') 為 data 的 view，不複製；
+        xy 基底下取其他預設基底的分量 (例如 'RL') 時以單一分量 einsum 計算，
+        數值與 RCWA.XY2RL 相同 (未歸一化的 (1, ±i) 基底，為 in_basis("circular") 的 2 倍)。
+
+        Parameters
+        - data: [..., 2, 2] 的 torch tensor 或 numpy array
+        - out_labels / in_labels: data 的輸出、輸入基底的偏振態標籤 (預設 "xy")
+        - keys: mapping 中列出的分量 (xy 基底預設為 linear 與 circular 的全部 8 個)
+    '''
+    def __init__(self, data, out_labels="xy", in_labels="xy", keys=None):
+        if tuple(data.shape[-2:]) != (2, 2):
+            raise ValueError(f"Jones tensor must end with [2, 2], got shape {tuple(data.shape)}")
+        self.data = data
+        self.out_labels = out_labels
+        self.in_labels = in_labels
+        if keys is None:
+            keys = [o + i for o in out_labels for i in in_labels]
+            if out_labels == in_labels == "xy":
+                keys += [o + i for o in BASES["circular"][0] for i in BASES["circular"][0]]
+        self._keys = list(keys)
+
+    @property
+    def shape(self):
+        return tuple(self.data.shape[:-2])
+
+    def __getitem__(self, key):
+        if len(key) != 2:
+            raise KeyError(key)
+        out_label, in_label = key
+        if out_label in self.out_labels and in_label in self.in_labels:
+            return self.data[..., self.out_labels.index(out_label), self.in_labels.index(in_label)]
+        labels, matrix = BASES["circular"]
+        matrix = np.asarray(matrix, dtype=np.complex128)
+        if self.out_labels == self.in_labels == "xy" and out_label in labels and in_label in labels:
+            return component(self.data, matrix[:, labels.index(out_label)], matrix[:, labels.index(in_label)])
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def in_basis(self, out_basis, in_basis=None):
+        """
+        轉換到任意 (橢圓) 基底，回傳新的 JonesTensor (只在此時建立一份轉換後的資料)。
+        自訂基底的偏振態標籤為 "ab"。
+        """
+        if not self.out_labels == self.in_labels == "xy":
+            raise ValueError("in_basis is only supported from the linear (xy) basis")
+        in_basis = out_basis if in_basis is None else in_basis
+        return JonesTensor(change_basis(self.data, out_basis, in_basis),
+                           basis_matrix(out_basis)[0], basis_matrix(in_basis)[0])
+
@@ -0,0 +1,124 @@
+import os
+import glob
+import threading
+import numpy as np
+
+from polarization_cache import POLARIZATION_CHANNELS, sweep_index, circular_from_linear
+
+LINEAR_CHANNELS = ["xx", "xy", "yx", "yy"]
+
+
+class LiveResult:
+    '''
+        In-progress sweep result that can be displayed while it is being filled
+
+        結果以 [wvln, pd, thk, inc, azi, var1, var2, var3, var4, orders] 的 complex
+        array 儲存 (T 的 xx/xy/yx/yy)，done 記錄已完成的網格點，version 在每次
+        新增資料時遞增，讓 DataVisualize 判斷是否需要重繪。
+        寫入 (update / refresh) 與 LiveView 的讀取都持有 lock，讀到的數值與 done 一致。
+
+        - 同 process：把 LiveResult 傳給 RCWA.get_Sparameter(live=...)
+        - 其他節點：LiveResult.from_shard_dir 讀取 sweep_shard 的 part 檔，refresh() 時載入新檔
+    '''
+    def __init__(self, grid_shape, n_orders, dtype=np.complex64):
+        self.grid_shape = tuple(grid_shape)
+        self.values = {k: np.zeros(self.grid_shape + (n_orders,), dtype=dtype) for k in LINEAR_CHANNELS}
+        self.done = np.zeros(self.grid_shape, dtype=bool)
+        self.version = 0
+        self.finished = False
+        self.lock = threading.Lock()
+        self._shard_dir = None
+        self._seen_parts = set()
+
+    @classmethod
+    def from_lists(cls, wvln_list, period_list, thickness_list, inc_ang_list, azi_ang_list,
+                   var1_list, var2_list, var3_list, var4_list, orders_list, dtype=np.complex64):
+        grid = [len(a) for a in (wvln_list, period_list, thickness_list, inc_ang_list, azi_ang_list,
+                                 var1_list, var2_list, var3_list, var4_list)]
+        return cls(grid, len(orders_list), dtype)
+
+    @classmethod
+    def from_shard_dir(cls, spec, out_dir):
+        from sweep_shard import grid_shape, spec_hash
+        live = cls(grid_shape(spec), len(spec["orders_list"]))
+        live._shard_dir = (out_dir, spec_hash(spec))
+        live.refresh()
+        return live
+
+    def update(self, index, outputs):
+        """
+        index: 網格索引 (wvln_idx, ..., var4_idx)
+        outputs: RCWA.forward 的回傳值 (txx, txy, tyx, tyy, ...)，只保留穿透的四個分量
+        """
+        values = [value.detach().cpu().numpy() if hasattr(value, "detach") else value
+                  for value in outputs[:len(LINEAR_CHANNELS)]]
+        with self.lock:
+            for key, value in zip(LINEAR_CHANNELS, values):
+                self.values[key][index] = value
+            self.done[index] = True
+            self.version += 1
+
+    def refresh(self):
+        """
+        載入新出現的 shard part 檔 (from_shard_dir 建立時才有作用)。
+        """
+        if self._shard_dir is None:
+            return
+        out_dir, tag = self._shard_dir
+        for part in sorted(glob.glob(os.path.join(out_dir, f"shard_{tag}_*_part*.npz"))):
+            if part in self._seen_parts:
+                continue
+            with np.load(part) as data:
+                index = np.unravel_index(data["indices"], self.grid_shape)
+                # spec 的 channels 選擇沒有的分量不在 part 檔中 (保持為 0)
+                values = {key: data[f"T_{key}"] for key in LINEAR_CHANNELS if f"T_{key}" in data}
+            with self.lock:
+                for key, value in values.items():
+                    self.values[key][index] = value
+                self.done[index] = True
+                self.version += 1
+            self._seen_parts.add(part)
+        with self.lock:
+            self.finished = bool(self.done.all())
+
+    def progress(self):
+        with self.lock:
+            return int(self.done.sum()), self.done.size
+
+    def snapshot(self, index, keys):
+        """
+        在 lock 內複製 index 範圍的 done 與 keys 分量，回傳 (done, [values...])。
+        """
+        with self.lock:
+            return np.array(self.done[index[:-1]]), [np.array(self.values[k][index]) for k in keys]
+
+
+class LiveView:
+    '''
+        DataVisualize 的 data1/data2 介面：只計算切片範圍內的 |t|^2 或 arg(t)，
+        尚未完成的網格點以 NaN 表示 (imshow 會留白)。
+    '''
+    def __init__(self, live, kind, shape_type, order_index=0, inc_index=0, azi_index=0):
+        self.live = live
+        self.kind = kind
+        self.index = sweep_index(shape_type, order_index, inc_index, azi_index, leading_orders=False)
+        shape = live.values["xx"].shape
+        self.shape = tuple(n for n, i in zip(shape, self.index) if isinstance(i, slice)) + (len(POLARIZATION_CHANNELS),)
+
+    @property
+    def version(self):
+        return self.live.version
+
+    def __getitem__(self, slicing):
+        *slicing, channel = slicing
+        # 將顯示維度的切片填回完整的掃描索引
+        slicing = iter(slicing)
+        index = tuple(next(slicing) if isinstance(i, slice) else i for i in self.index)
+        key = POLARIZATION_CHANNELS[channel][1]
+        if key in self.live.values:
+            done, (t,) = self.live.snapshot(index, [key])
+        else:
+            done, values = self.live.snapshot(index, LINEAR_CHANNELS)
+            t = circular_from_linear(*values, key)
+        data = np.abs(t)**2 if self.kind == "amplitude" else np.angle(t)
+        return np.where(done, data, np.nan)
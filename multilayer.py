@@ -0,0 +1,347 @@
+import copy
+import threading
+from collections import OrderedDict
+import torch
+import torcwa
+from Materials import Material
+from eps_kernel import EpsKernel
+
+# torcwa.rcwa 內每一層各自的資料 (add_layer 時 append 到這些 list)
+LAYER_FIELDS = ["thickness", "eps_conv", "mu_conv", "P", "Q", "kz_norm", "E_eigvec", "H_eigvec",
+                "Cf", "Cb", "layer_S11", "layer_S21", "layer_S12", "layer_S22"]
+# 與厚度無關的部分 (Fourier 卷積矩陣與 eigenmodes)
+MODE_FIELDS = ["eps_conv", "mu_conv", "P", "Q", "kz_norm", "E_eigvec"]
+# torcwa.rcwa 中每次加入內部層都會 append 的 list
+SIM_LAYER_LISTS = LAYER_FIELDS + ["Pinv_instability", "Qinv_instability"]
+
+
+def swept_layer(args):
+    """
+    原本 RCWA 的 Layer 1：材料與形狀來自 args，thickness 與 var1..var4 由 sweep 決定。
+    """
+    return {"swept": True, "material_a": args["Layer 1 material A"], "material_b": args["Layer 1 material B"],
+            "shape_type": args["Shape type"]}
+
+
+def _requires_grad(value):
+    return torch.is_tensor(value) and value.requires_grad
+
+
+def _plain(value):
+    if torch.is_tensor(value):
+        return float(value.detach())
+    return float(value)
+
+
+class LayerCache:
+    '''
+        LRU cache of per-layer torcwa data, capped at max_bytes
+    '''
+    def __init__(self, max_bytes=512 << 20):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _size(entry):
+        return sum(v.element_size()*v.nelement() for v in entry.values() if torch.is_tensor(v))
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, entry):
+        size = self._size(entry)
+        with self.lock:
+            if key in self.entries:
+                return
+            self.entries[key] = entry
+            self.nbytes += size
+            while self.nbytes > self.max_bytes and len(self.entries) > 1:
+                _, old = self.entries.popitem(last=False)
+                self.nbytes -= self._size(old)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.nbytes = 0
+
+
+class StackSolver:
+    '''
+        N-layer stack solver with cached per-layer S-matrices
+
+        layers 由輸入側到輸出側排列，每層為 dict：
+        - 均勻層: {"thickness": 100., "material": "SiO2.txt"}
+        - 圖形層: {"thickness": 300., "material_a": "aSiH.txt", "material_b": "air.txt",
+                   "shape_type": "circle", "vars": [var1, var2, var3, var4]}
+
+        每層的 S-matrix 以 (wavelength, period, angles, input material, 該層內容) 為 key 快取，
+        組合時由 torcwa 的 Redheffer star product 串接，所以 sweep 只改變其中一層時，
+        其他層直接取用快取。參數為 requires_grad 的 tensor 時該層不快取，保留計算圖。
+
+        Solver session: 同一組 (wavelength, period, angles) 的輸入/輸出半空間 (k-vectors、
+        Sin、Sout) 與材料介電係數只計算一次，之後的 geometry / thickness 組合複製這個
+        模擬樣板；層的 eigenmodes 與厚度無關，另外以不含厚度的 key 快取，
+        thickness sweep 只需重算該層的 S-matrix。
+    '''
+    def __init__(self, harmonic_order, input_material, output_material, *, nx=300, ny=300, edge_sharpness=1000.,
+                 sim_dtype=torch.complex64, geo_dtype=torch.float32, device=torch.device('cpu'), cache_bytes=512 << 20, max_sessions=64,
+                 compile_kernels=False):
+        self.harmonic_order = harmonic_order
+        self.input_material = input_material
+        self.output_material = output_material
+        self.nx = nx
+        self.ny = ny
+        self.edge_sharpness = edge_sharpness
+        self.sim_dtype = sim_dtype
+        self.geo_dtype = geo_dtype
+        self.device = device
+        self.cache = LayerCache(cache_bytes)
+        self.modes = LayerCache(cache_bytes)
+        self.max_sessions = max_sessions
+        self.sessions = OrderedDict()
+        self.eps_kernel = EpsKernel(compile_kernels)
+
+    def material_eps(self, name, lamb0, session=None):
+        if session is None:
+            return Material.apply(lamb0, 0.005, name)**2
+        if name not in session["eps"]:
+            session["eps"][name] = Material.apply(lamb0, 0.005, name)**2
+        return session["eps"][name]
+
+    def layer_eps(self, layer, lamb0, pd, session=None):
+        """
+        單層的介電係數：均勻層回傳純量，圖形層回傳 [nx, ny] 分佈。
+        """
+        if "material" in layer:
+            return self.material_eps(layer["material"], lamb0, session)
+        eps_a = self.material_eps(layer["material_a"], lamb0, session)
+        eps_b = self.material_eps(layer["material_b"], lamb0, session)
+        return self.eps_kernel(layer["shape_type"], self.nx, self.ny, self.edge_sharpness, pd, layer["vars"],
+                               eps_a, eps_b, self.geo_dtype, self.device)
+
+    def layer_key(self, point_key, layer, thickness=True):
+        values = ([layer["thickness"]] if thickness else []) + list(layer.get("vars", []))
+        if any(_requires_grad(v) for v in values) or point_key is None:
+            return None
+        description = tuple(sorted((k, v) for k, v in layer.items() if k not in ("thickness", "vars")))
+        return (point_key, description, tuple(_plain(v) for v in values), self.edge_sharpness)
+
+    @staticmethod
+    def _capture(sim):
+        return {name: getattr(sim, name)[-1] for name in LAYER_FIELDS}
+
+    @staticmethod
+    def _append(sim, entry):
+        for name in LAYER_FIELDS:
+            getattr(sim, name).append(entry[name])
+        sim.layer_N += 1
+
+    @staticmethod
+    def _append_modes(sim, entry, thickness, solve=True):
+        # 與 torcwa.rcwa.add_layer 相同的順序，eigenmodes 直接取用快取
+        for name in MODE_FIELDS:
+            getattr(sim, name).append(entry[name])
+        sim.thickness.append(thickness)
+        sim.layer_N += 1
+        if solve:
+            sim._solve_layer_smatrix()
+
+    def session(self, wvln, pd, inc_deg, azi_deg, point_key):
+        """
+        回傳 (torcwa 模擬, session)。point_key 不為 None 時重複使用同一組
+        (wavelength, period, angles) 已建立的半空間，只複製樣板並清空內部層。
+        """
+        if point_key is None:
+            sim, lamb0 = self.build(wvln, pd, inc_deg, azi_deg)
+            return sim, {"lamb0": lamb0, "eps": {}}
+        session = self.sessions.get(point_key)
+        if session is None:
+            template, lamb0 = self.build(wvln, pd, inc_deg, azi_deg)
+            session = {"template": template, "lamb0": lamb0, "eps": {}}
+            self.sessions[point_key] = session
+            while len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+        else:
+            self.sessions.move_to_end(point_key)
+        sim = copy.copy(session["template"])
+        for name in SIM_LAYER_LISTS:
+            if isinstance(getattr(sim, name, None), list):
+                setattr(sim, name, [])
+        sim.layer_N = 0
+        return sim, session
+
+    def build(self, wvln, pd, inc_deg, azi_deg):
+        """
+        建立已設定輸入/輸出半空間與入射角的 torcwa 模擬 (尚未加入內部層)。
+        """
+        lamb0 = torch.as_tensor(wvln, dtype=self.geo_dtype, device=self.device)    # nm
+        sim = torcwa.rcwa(freq=1/lamb0, order=[self.harmonic_order, self.harmonic_order], L=[pd, pd],
+                          dtype=self.sim_dtype, device=self.device)
+        sim.add_input_layer(eps=Material.apply(lamb0, 0.005, self.input_material)**2)
+        sim.add_output_layer(eps=Material.apply(lamb0, 0.005, self.output_material)**2)
+        sim.set_incident_angle(inc_ang=inc_deg*(torch.pi/180), azi_ang=azi_deg*(torch.pi/180))
+        return sim, lamb0
+
+    def solve(self, wvln, pd, inc_deg, azi_deg, layers, order_list, channels=None):
+        """
+        回傳與 RCWA.forward 相同的 (txx, txy, tyx, tyy, rxx, rxy, ryx, ryy)。
+        channels: 要取出的 [(port, 分量), ...] (channels.FORWARD_CHANNELS 的子集)，其餘輸出為 None。
+        """
+        sim = self.simulate(wvln, pd, inc_deg, azi_deg, layers)
+        return self.s_parameters(sim, order_list, channels)
+
+    def simulate(self, wvln, pd, inc_deg, azi_deg, layers):
+        """
+        組合 stack 並求解 global S-matrix，回傳 torcwa.rcwa 物件 (可再計算 S-parameters 或場分佈)。
+        """
+        point = (wvln, pd, inc_deg, azi_deg)
+        point_key = None if any(_requires_grad(v) for v in point) else tuple(_plain(v) for v in point)
+        sim, session = self.session(wvln, pd, inc_deg, azi_deg, point_key)
+        for layer in layers:
+            key = self.layer_key(point_key, layer)
+            entry = None if key is None else self.cache.get(key)
+            if entry is not None:
+                self._append(sim, entry)
+                continue
+            mode_key = self.layer_key(point_key, layer, thickness=False)
+            modes = None if mode_key is None else self.modes.get(mode_key)
+            if modes is not None:
+                self._append_modes(sim, modes, layer["thickness"])
+            else:
+                sim.add_layer(thickness=layer["thickness"], eps=self.layer_eps(layer, session["lamb0"], pd, session))
+                if mode_key is not None:
+                    self.modes.put(mode_key, {name: getattr(sim, name)[-1] for name in MODE_FIELDS})
+            if key is not None:
+                self.cache.put(key, self._capture(sim))
+        sim.solve_global_smatrix()
+        return sim
+
+    def solve_angles(self, wvln, pd, angles, layers, order_list, channels=None):
+        """
+        同一 geometry 與波長下一次求解多組 (inc_deg, azi_deg)。
+        材料、幾何與 Fourier 卷積矩陣 (及其反矩陣) 只計算一次，各角度圖形層的
+        eigenproblem 堆疊成一個 batch 求解；半空間與層快取仍依角度各自使用 session。
+        回傳 list，每個元素為該角度的 forward 輸出。
+        """
+        values = [wvln, pd] + [a for pair in angles for a in pair]
+        values += [v for layer in layers for v in [layer["thickness"]] + list(layer.get("vars", []))]
+        if any(_requires_grad(v) for v in values):
+            return [self.solve(wvln, pd, inc_deg, azi_deg, layers, order_list, channels) for inc_deg, azi_deg in angles]
+        point_keys = [tuple(_plain(v) for v in (wvln, pd, inc_deg, azi_deg)) for inc_deg, azi_deg in angles]
+        sims, sessions = zip(*(self.session(wvln, pd, inc_deg, azi_deg, key)
+                               for (inc_deg, azi_deg), key in zip(angles, point_keys)))
+        for layer in layers:
+            pending = []
+            for sim, point_key in zip(sims, point_keys):
+                key = self.layer_key(point_key, layer)
+                entry = None if key is None else self.cache.get(key)
+                if entry is not None:
+                    self._append(sim, entry)
+                    continue
+                mode_key = self.layer_key(point_key, layer, thickness=False)
+                modes = None if mode_key is None else self.modes.get(mode_key)
+                if modes is not None:
+                    self._append_modes(sim, modes, layer["thickness"])
+                elif "material" in layer:
+                    # 均勻層的 eigenmodes 為解析解，不需 batch
+                    sim.add_layer(thickness=layer["thickness"], eps=self.layer_eps(layer, sessions[0]["lamb0"], pd, sessions[0]))
+                    if mode_key is not None:
+                        self.modes.put(mode_key, {name: getattr(sim, name)[-1] for name in MODE_FIELDS})
+                else:
+                    pending.append((sim, key, mode_key))
+                    continue
+                if key is not None:
+                    self.cache.put(key, self._capture(sim))
+            if pending:
+                self._batched_layer(layer, pd, sessions[0], [sim for sim, _, _ in pending])
+                for sim, key, mode_key in pending:
+                    if mode_key is not None:
+                        self.modes.put(mode_key, {name: getattr(sim, name)[-1] for name in MODE_FIELDS})
+                    if key is not None:
+                        self.cache.put(key, self._capture(sim))
+        outputs = []
+        for sim in sims:
+            sim.solve_global_smatrix()
+            outputs.append(self.s_parameters(sim, order_list, channels))
+        return outputs
+
+    def _batched_layer(self, layer, pd, session, sims):
+        """
+        圖形層在多個角度下的 eigen-decomposition (與 torcwa.rcwa._eigen_decomposition 相同的矩陣)。
+        """
+        eps = self.layer_eps(layer, session["lamb0"], pd, session)
+        template = sims[0]
+        eps_conv = template._material_conv(eps)
+        mu_conv = torch.eye(template.order_N, dtype=self.sim_dtype, device=self.device)
+        eps_inv = torch.linalg.inv(eps_conv)
+        zeros = torch.zeros_like(eps_conv)
+        P_base = torch.hstack((torch.vstack((zeros, -mu_conv)), torch.vstack((mu_conv, zeros))))
+        Q_base = torch.hstack((torch.vstack((zeros, eps_conv)), torch.vstack((-eps_conv, zeros))))
+        P, Q = [], []
+        for sim in sims:
+            K = torch.vstack((sim.Kx_norm, sim.Ky_norm))
+            P.append(P_base + torch.matmul(torch.matmul(K, eps_inv), torch.hstack((sim.Ky_norm, -sim.Kx_norm))))
+            Q.append(Q_base + torch.matmul(K, torch.hstack((-sim.Ky_norm, sim.Kx_norm))))
+        P, Q = torch.stack(P), torch.stack(Q)
+        kz_norm, E_eigvec = torch.linalg.eig(torch.matmul(P, Q))
+        kz_norm = torch.sqrt(kz_norm)
+        kz_norm = torch.where(torch.imag(kz_norm)<0, -kz_norm, kz_norm)    # Normalized kz for positive mode
+        for i, sim in enumerate(sims):
+            self._append_modes(sim, {"eps_conv": eps_conv, "mu_conv": mu_conv, "P": P[i], "Q": Q[i],
+                                     "kz_norm": kz_norm[i], "E_eigvec": E_eigvec[i]}, layer["thickness"], solve=False)
+        self._batched_layer_smatrix(sims, P, kz_norm, E_eigvec, layer["thickness"])
+
+    def _batched_layer_smatrix(self, sims, P, kz_norm, E_eigvec, thickness):
+        """
+        torcwa.rcwa._solve_layer_smatrix 的 batch 版本 (avoid_Pinv_instability=False)，
+        inv(Vf) 與 inv(Ctmp) 各只計算一次。
+        """
+        N2 = P.shape[-1]
+        eye = torch.eye(N2, dtype=self.sim_dtype, device=self.device)
+        omega = torch.stack([torch.as_tensor(sim.omega, dtype=self.sim_dtype, device=self.device) for sim in sims])
+        Vf = torch.stack([sim.Vf for sim in sims])
+        phase = torch.exp(1.j*omega[:, None]*kz_norm*thickness)
+        # E @ diag(kz) 與 E @ diag(phase) 以逐欄相乘計算
+        H_eigvec = torch.matmul(torch.linalg.inv(P), E_eigvec*kz_norm[:, None, :])
+        VH = torch.matmul(torch.linalg.inv(Vf), H_eigvec)
+        A = E_eigvec + VH
+        B = (E_eigvec - VH)*phase[:, None, :]
+        Cinv = torch.linalg.inv(torch.cat((torch.cat((A, B), dim=-1), torch.cat((B, A), dim=-1)), dim=-2))
+        # Mode coupling coefficients
+        Cf, Cb = 2*Cinv[..., :N2], 2*Cinv[..., N2:]
+        E_phase = E_eigvec*phase[:, None, :]
+        S11 = torch.matmul(E_phase, Cf[:, :N2]) + torch.matmul(E_eigvec, Cf[:, N2:])
+        S21 = torch.matmul(E_eigvec, Cf[:, :N2]) + torch.matmul(E_phase, Cf[:, N2:]) - eye
+        S12 = torch.matmul(E_phase, Cb[:, :N2]) + torch.matmul(E_eigvec, Cb[:, N2:]) - eye
+        S22 = torch.matmul(E_eigvec, Cb[:, :N2]) + torch.matmul(E_phase, Cb[:, N2:])
+        for i, sim in enumerate(sims):
+            sim.H_eigvec.append(H_eigvec[i])
+            sim.Cf.append(Cf[i])
+            sim.Cb.append(Cb[i])
+            sim.layer_S11.append(S11[i])
+            sim.layer_S21.append(S21[i])
+            sim.layer_S12.append(S12[i])
+            sim.layer_S22.append(S22[i])
+
+    @staticmethod
+    def s_parameters(sim, order_list, channels=None):
+        outputs = []
+        for port, name in (('T', 'transmission'), ('R', 'r')):
+            for polarization in ('xx', 'xy', 'yx', 'yy'):
+                if channels is not None and (port, polarization) not in channels:
+                    outputs.append(None)
+                    continue
+                outputs.append(sim.S_parameters(orders=order_list, direction='forward', port=name,
+                                                polarization=polarization, ref_order=[0, 0]))
+        return tuple(outputs)
@@ -0,0 +1,164 @@
+import time
+import numpy as np
+import torch
+from surrogate import sweep_samples
+
+
+class MetaAtomMLP(torch.nn.Module):
+    '''
+        Compact MLP: 正規化後的掃描參數 -> 各 order 的 Re/Im
+    '''
+    def __init__(self, n_inputs, n_outputs, hidden=128, depth=3):
+        super().__init__()
+        layers = []
+        width = n_inputs
+        for _ in range(depth):
+            layers += [torch.nn.Linear(width, hidden), torch.nn.SiLU()]
+            width = hidden
+        layers.append(torch.nn.Linear(width, 2*n_outputs))
+        self.net = torch.nn.Sequential(*layers)
+
+    def forward(self, x):
+        return self.net(x)
+
+
+class NeuralSurrogate:
+    '''
+        CPU-trainable neural surrogate for meta-atom responses
+
+        以 get_Sparameter 的掃描結果訓練小型 MLP，保留一部分 RCWA 網格點
+        作為驗證集並回報誤差，訓練後可在 CPU 上批次預測大量候選幾何。
+
+        Parameters
+        - hidden / depth: MLP 寬度與層數
+        - threads: 訓練/預測時 torch 使用的 thread 數 (None 表示不變更)
+    '''
+    def __init__(self, hidden=128, depth=3, threads=None):
+        self.hidden = hidden
+        self.depth = depth
+        self.threads = threads
+        self.model = None
+        self.axis_names = None
+        self.history = []
+
+    def fit(self, result, axes, port='T', polarization='xx', val_fraction=0.1, epochs=200,
+            batch_size=4096, lr=1e-3, seed=0, log_every=20):
+        """
+        result / axes: 同 GridSurrogate (axes 順序為 surrogate.AXIS_NAMES)
+        回傳 validation 指標 dict。
+        threads 只在訓練期間套用，結束後恢復原本的 torch thread 數 (GUI 中的 RCWA sweep 不受影響)。
+        """
+        previous_threads = torch.get_num_threads()
+        if self.threads is not None:
+            torch.set_num_threads(self.threads)
+        try:
+            return self._fit(result, axes, port, polarization, val_fraction, epochs, batch_size, lr, seed, log_every)
+        finally:
+            torch.set_num_threads(previous_threads)
+
+    def _fit(self, result, axes, port, polarization, val_fraction, epochs, batch_size, lr, seed, log_every):
+        points, values, self.axis_names = sweep_samples(result[port][polarization], axes)
+        if not self.axis_names:
+            raise ValueError("sweep has no free dimension to learn")
+        self.port = port
+        self.polarization = polarization
+
+        rng = np.random.default_rng(seed)
+        perm = rng.permutation(len(points))
+        n_val = max(1, int(round(len(points)*val_fraction)))
+        val_idx, train_idx = perm[:n_val], perm[n_val:]
+        if len(train_idx) == 0:
+            raise ValueError("not enough sweep points for a train/validation split")
+
+        # 輸入以網格範圍正規化到 [-1, 1]
+        self.x_min = points.min(axis=0)
+        self.x_span = np.where(points.max(axis=0) > self.x_min, points.max(axis=0) - self.x_min, 1.)
+        x = torch.as_tensor(self._normalize(points), dtype=torch.float32)
+        y = torch.as_tensor(np.concatenate([values.real, values.imag], axis=1), dtype=torch.float32)
+
+        torch.manual_seed(seed)
+        self.n_orders = values.shape[1]
+        self.model = MetaAtomMLP(x.shape[1], self.n_orders, self.hidden, self.depth)
+        optimizer = torch.optim.Adam(self.model.parameters(), lr=lr)
+        scheduler = torch.optim.lr_scheduler.CosineAnnealingLR(optimizer, T_max=epochs)
+        x_train, y_train = x[train_idx], y[train_idx]
+        x_val, y_val = x[val_idx], y[val_idx]
+
+        start = time.time()
+        self.history = []
+        for epoch in range(epochs):
+            self.model.train()
+            order = torch.randperm(len(x_train))
+            for i in range(0, len(order), batch_size):
+                batch = order[i:i + batch_size]
+                loss = torch.mean((self.model(x_train[batch]) - y_train[batch])**2)
+                optimizer.zero_grad()
+                loss.backward()
+                optimizer.step()
+            scheduler.step()
+            if (epoch + 1) % log_every == 0 or epoch == epochs - 1:
+                metrics = self._metrics(x_val, y_val)
+                self.history.append((epoch + 1, loss.item(), metrics))
+                print(f"epoch {epoch + 1}/{epochs} train mse {loss.item():.3e} "
+                      f"val |dt| rms {metrics['rms_abs_error']:.3e} max {metrics['max_abs_error']:.3e}")
+        self.validation = self._metrics(x_val, y_val)
+        self.validation["train_time"] = time.time() - start
+        self.validation["n_train"] = len(train_idx)
+        self.validation["n_val"] = n_val
+        return self.validation
+
+    def _normalize(self, points):
+        return 2.*(np.asarray(points, dtype=float) - self.x_min)/self.x_span - 1.
+
+    def _to_complex(self, y):
+        return torch.complex(y[:, :self.n_orders], y[:, self.n_orders:])
+
+    @torch.inference_mode()
+    def _metrics(self, x, y):
+        self.model.eval()
+        pred = self._to_complex(self.model(x))
+        true = self._to_complex(y)
+        err = torch.abs(pred - true)
+        phase_err = torch.abs(torch.angle(pred*torch.conj(true)))
+        return {
+            "rms_abs_error": torch.sqrt(torch.mean(err**2)).item(),
+            "max_abs_error": torch.max(err).item(),
+            "mean_phase_error": torch.mean(phase_err).item(),
+        }
+
+    @torch.inference_mode()
+    def predict(self, query, batch_size=1 << 16):
+        """
+        query: {axis name: array} 或 (N, D) array (欄位順序同 self.axis_names)
+        回傳 complex64 tensor，shape 為 [N, orders]。
+        """
+        if self.model is None:
+            raise RuntimeError("surrogate is not trained")
+        if isinstance(query, dict):
+            points = np.stack([np.asarray(query[name], dtype=float).ravel() for name in self.axis_names], axis=1)
+        else:
+            points = np.atleast_2d(np.asarray(query, dtype=float))
+        x = torch.as_tensor(self._normalize(points), dtype=torch.float32)
+        self.model.eval()
+        out = [self._to_complex(self.model(x[i:i + batch_size])) for i in range(0, len(x), batch_size)]
+        return torch.cat(out, dim=0)
+
+    def save(self, filename):
+        torch.save({
+            "hidden": self.hidden, "depth": self.depth,
+            "axis_names": self.axis_names, "n_orders": self.n_orders,
+            "port": self.port, "polarization": self.polarization,
+            "x_min": self.x_min, "x_span": self.x_span,
+            "validation": self.validation,
+            "state_dict": self.model.state_dict(),
+        }, filename)
+
+    @classmethod
+    def load(cls, filename):
+        state = torch.load(filename, weights_only=False)
+        surrogate = cls(hidden=state["hidden"], depth=state["depth"])
+        for key in ("axis_names", "n_orders", "port", "polarization", "x_min", "x_span", "validation"):
+            setattr(surrogate, key, state[key])
+        surrogate.model = MetaAtomMLP(len(state["axis_names"]), state["n_orders"], state["hidden"], state["depth"])
+        surrogate.model.load_state_dict(state["state_dict"])
+        return surrogate
@@ -0,0 +1,184 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+
+from jones import JonesTensor
+
+# DataVisualize 的 polarization 選單 (輸入->輸出) 對應 Jones 分量 (torcwa 慣例: 輸出在前、輸入在後)
+POLARIZATION_CHANNELS = [
+    ("XLP->XLP", "xx"), ("XLP->YLP", "yx"), ("YLP->XLP", "xy"), ("YLP->YLP", "yy"),
+    ("LCP->LCP", "LL"), ("LCP->RCP", "RL"), ("RCP->LCP", "LR"), ("RCP->RCP", "RR"),
+]
+# 各形狀在 DataVisualize 中顯示的 var1..var4 維度
+SHAPE_VAR_DIMS = {
+    'circle': [0],
+    'square': [0, 2],
+    'rectangle': [0, 1, 2],
+    'ellipse': [0, 1, 2],
+    'rhombus': [0, 1, 2],
+    'cross': [0, 1, 2],
+    'hollow_square': [0, 1, 2],
+    'hollow_circle': [0, 1],
+}
+# DataVisualize.parseDataSheet 對應 SHAPE_VAR_DIMS 各維度的 data_sheet 欄位名稱
+SHAPE_VAR_NAMES = {
+    'circle': ["R"],
+    'square': ["Wx", "Theta"],
+    'rectangle': ["Wx", "Wy", "Theta"],
+    'ellipse': ["Rx", "Ry", "Theta"],
+    'rhombus': ["Wx", "Wy", "Theta"],
+    'cross': ["Wx", "Wy", "Theta"],
+    'hollow_square': ["Wx", "Hollow_W", "Theta"],
+    'hollow_circle': ["R", "Hollow_R"],
+}
+N_SWEEP_DIMS = 9
+
+
+def make_data_sheet(shape_type, wvln_list, period_list, thickness_list, var_lists, jones, order_index=0):
+    """
+    由 get_Sparameter 的 list 與 Jones 結果 (例如 result["T"]) 組成 DataVisualize 的 data_sheet。
+    var_lists: [var1_list, var2_list, var3_list, var4_list]
+    """
+    data_sheet = {"shape_type": shape_type, "Wavelength": list(wvln_list), "Period": list(period_list),
+                  "Thickness": list(thickness_list), "jones": jones, "order_index": order_index}
+    for d, name in zip(SHAPE_VAR_DIMS[shape_type], SHAPE_VAR_NAMES[shape_type]):
+        data_sheet[name] = list(var_lists[d])
+    return data_sheet
+
+
+def sweep_index(shape_type, order_index=0, inc_index=0, azi_index=0, leading_orders=True):
+    """
+    由 get_Sparameter 的結果張量選出 DataVisualize 顯示的維度：
+    wvln, pd, thk 全取，inc/azi 固定，var 依形狀保留，其餘取第 0 筆。
+    leading_orders: 張量是否有 get_Sparameter 前置的 orders 維度
+    """
+    var_dims = SHAPE_VAR_DIMS[shape_type]
+    index = [slice(None)]*3 + [inc_index, azi_index]
+    index += [slice(None) if d in var_dims else 0 for d in range(4)]
+    index.append(order_index)
+    if leading_orders:
+        index.insert(0, 0)
+    return index
+
+
+def circular_from_linear(xx, xy, yx, yy, key):
+    """
+    與 RCWA.XY2RL 相同的圓偏振換算。
+    """
+    if key == "RL":
+        return (xx - yy) - 1j*(xy + yx)
+    if key == "RR":
+        return (xx + yy) + 1j*(xy - yx)
+    if key == "LR":
+        return (xx - yy) + 1j*(xy + yx)
+    return (xx + yy) - 1j*(xy - yx)
+
+
+def _to_numpy(value):
+    if hasattr(value, "detach"):
+        value = value.detach().cpu().numpy()
+    return np.asarray(value)
+
+
+class PolarizationCache:
+    '''
+        Lazily computed |t|^2 / arg(t) per polarization channel with an LRU memory cap
+
+        Parameters
+        - jones: {'xx': tensor, 'xy': ..., 'yx': ..., 'yy': ..., ('RL', 'RR', 'LR', 'LL' 可省略)}
+                 tensor 為 get_Sparameter 的輸出格式
+                 [orders, wvln, pd, thk, inc, azi, var1, var2, var3, var4, orders]
+        - shape_type: 決定保留哪些 var 維度 (SHAPE_VAR_DIMS)
+        - order_index: 顯示的繞射階 (orders_list 中的索引)
+        - inc_index / azi_index: 固定的入射角、方位角索引
+        - max_bytes: 快取上限，超過時淘汰最久未使用的 channel
+        - chunk_bytes: 計算時沿波長維度分塊讀取，每個分量每塊不超過此大小 (同 reduction.ReductionEngine)
+    '''
+    def __init__(self, jones, shape_type, order_index=0, inc_index=0, azi_index=0, max_bytes=512 << 20,
+                 chunk_bytes=64 << 20):
+        self.jones = jones
+        self.max_bytes = max_bytes
+        self.chunk_bytes = chunk_bytes
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+
+        sample = next(iter(jones.values()))
+        self.index = sweep_index(shape_type, order_index, inc_index, azi_index,
+                                 leading_orders=len(sample.shape) == N_SWEEP_DIMS + 2)
+        self.shape = tuple(n for n, i in zip(sample.shape[-N_SWEEP_DIMS - 1:], self.index[-N_SWEEP_DIMS - 1:])
+                           if isinstance(i, slice)) + (len(POLARIZATION_CHANNELS),)
+        # 分塊的維度 (顯示的第一個維度，即波長) 在 self.index 中的位置
+        self.row_axis = next(d for d, i in enumerate(self.index) if isinstance(i, slice))
+
+    def field(self, key, rows=slice(None)):
+        """
+        取出單一 Jones 分量在 rows (波長維度的切片) 的部分，轉成 [wvln, pd, thk, vars...] 的 complex array。
+        圓偏振分量若不在結果內，則由線偏振分量換算；
+        結果只保留部分分量 (channels.ChannelSelection) 而無法取得時回傳 NaN。
+        """
+        index = list(self.index)
+        index[self.row_axis] = rows
+        if isinstance(self.jones, JonesTensor):
+            # 先切出顯示的部分再取分量，圓偏振分量只對切片做 einsum
+            sliced = JonesTensor(self.jones.data[tuple(index)], self.jones.out_labels, self.jones.in_labels)
+            try:
+                return _to_numpy(sliced[key])
+            except KeyError:
+                pass
+        elif key in self.jones:
+            return _to_numpy(self.jones[key][tuple(index)])
+        if all(k in self.jones for k in ("xx", "xy", "yx", "yy")):
+            return circular_from_linear(*(self.field(k, rows) for k in ("xx", "xy", "yx", "yy")), key)
+        shape = (len(range(*rows.indices(self.shape[0]))),) + self.shape[1:-1]
+        return np.full(shape, np.nan, dtype=np.complex64)
+
+    def _compute(self, key):
+        """
+        沿波長維度分塊計算 (|t|^2, arg t)，同一時間只有一塊的分量資料在記憶體中。
+        """
+        rows = self.shape[0]
+        row_bytes = int(np.prod(self.shape[1:-1]))*16
+        step = max(1, self.chunk_bytes//max(row_bytes, 1))
+        amplitude = phase = None
+        for start in range(0, rows, step):
+            t = self.field(key, slice(start, min(start + step, rows)))
+            if amplitude is None:
+                dtype = np.abs(t[:0]).dtype
+                amplitude = np.empty(self.shape[:-1], dtype=dtype)
+                phase = np.empty(self.shape[:-1], dtype=dtype)
+            amplitude[start:start + len(t)] = np.abs(t)**2
+            phase[start:start + len(t)] = np.angle(t)
+        return amplitude, phase
+
+    def get(self, channel, kind):
+        """
+        channel: POLARIZATION_CHANNELS 的索引；kind: 'amplitude' (|t|^2) 或 'phase' (arg t)
+        """
+        with self.lock:
+            key = (channel, kind)
+            if key in self.cache:
+                self.cache.move_to_end(key)
+                return self.cache[key]
+            amplitude, phase = self._compute(POLARIZATION_CHANNELS[channel][1])
+            for k, value in (("amplitude", amplitude), ("phase", phase)):
+                self.cache[(channel, k)] = value
+                self.cache.move_to_end((channel, k))
+            # LRU 淘汰，保留剛計算的這一組
+            while sum(v.nbytes for v in self.cache.values()) > self.max_bytes and len(self.cache) > 2:
+                self.cache.popitem(last=False)
+            return self.cache[key]
+
+
+class PolarizationView:
+    '''
+        讓 PolarizationCache 以 DataVisualize 的 data1/data2 介面使用：
+        shape 最後一維為 polarization，切片時最後一個索引選擇 channel。
+    '''
+    def __init__(self, cache, kind):
+        self.cache = cache
+        self.kind = kind
+        self.shape = cache.shape
+
+    def __getitem__(self, slicing):
+        *slicing, channel = slicing
+        return self.cache.get(channel, self.kind)[tuple(slicing)]
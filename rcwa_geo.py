@@ -20,7 +20,7 @@ class geometry:
             - Ly: y-direction Lattice constant (float)
             - x: x-axis sampling number (int)
             - y: y-axis sampling number (int)
-            - edge_sharpness: sharpness of edge (float)
+            - edge_sharpness: sharpness of edge (float, None: anti-aliased area coverage)
 
             Keyword Parameters
             - dtype: geometry data type (only torch.complex64 and torch.complex128 are allowed.)
@@ -36,6 +36,21 @@ class geometry:
         self.dtype = dtype
         self.device = device
 
+    def fill(self, level):
+        '''
+            level > 0 inside the shape
+
+            edge_sharpness 為 None 時回傳反鋸齒的像素面積覆蓋率：以 level 的梯度把 level
+            換算成到邊緣的距離 (以像素在法線方向的寬度為單位)，覆蓋率在邊緣像素內線性變化，
+            否則使用 sigmoid(edge_sharpness*level)。
+        '''
+        if self.edge_sharpness is None:
+            # 相鄰像素間的 level 變化量
+            dx, dy = torch.gradient(level)
+            footprint = torch.clamp(torch.abs(dx) + torch.abs(dy), min=torch.finfo(level.dtype).tiny)
+            return torch.clamp(0.5 + level/footprint, 0., 1.)
+        return torch.sigmoid(self.edge_sharpness*level)
+
     def grid(self):
         '''
             Update grid
@@ -54,7 +69,7 @@ class geometry:
 
         self.grid()
         level = 1. - torch.sqrt(((self.x_grid-Cx)/R)**2 + ((self.y_grid-Cy)/R)**2)
-        return torch.sigmoid(self.edge_sharpness*level)
+        return self.fill(level)
 
     def ellipse(self,Rx,Ry,Cx,Cy,theta=0.):
         '''
@@ -68,7 +83,7 @@ class geometry:
 
         self.grid()
         level = 1. - torch.sqrt((((self.x_grid-Cx)*torch.cos(theta)+(self.y_grid-Cy)*torch.sin(theta))/Rx)**2 + ((-(self.x_grid-Cx)*torch.sin(theta)+(self.y_grid-Cy)*torch.cos(theta))/Ry)**2)
-        return torch.sigmoid(self.edge_sharpness*level)
+        return self.fill(level)
 
     def square(self,W,var2,Cx,Cy,theta=0.):
         '''
@@ -82,7 +97,7 @@ class geometry:
 
         self.grid()
         level = 1. - (torch.maximum(torch.abs(((self.x_grid-Cx)*torch.cos(theta)+(self.y_grid-Cy)*torch.sin(theta))/(W/2.)),torch.abs((-(self.x_grid-Cx)*torch.sin(theta)+(self.y_grid-Cy)*torch.cos(theta))/(W/2.))))
-        return torch.sigmoid(self.edge_sharpness*level)
+        return self.fill(level)
 
     def rectangle(self,Wx,Wy,Cx,Cy,theta=0.):
         '''
@@ -97,7 +112,7 @@ class geometry:
 
         self.grid()
         level = 1. - (torch.maximum(torch.abs(((self.x_grid-Cx)*torch.cos(theta)+(self.y_grid-Cy)*torch.sin(theta))/(Wx/2.)),torch.abs((-(self.x_grid-Cx)*torch.sin(theta)+(self.y_grid-Cy)*torch.cos(theta))/(Wy/2.))))
-        return torch.sigmoid(self.edge_sharpness*level)
+        return self.fill(level)
 
     def rhombus(self,Wx,Wy,Cx,Cy,theta=0.):
         '''
@@ -112,7 +127,7 @@ class geometry:
 
         self.grid()
         level = 1. - (torch.abs(((self.x_grid-Cx)*torch.cos(theta)+(self.y_grid-Cy)*torch.sin(theta))/(Wx/2.)) + torch.abs((-(self.x_grid-Cx)*torch.sin(theta)+(self.y_grid-Cy)*torch.cos(theta))/(Wy/2.)))
-        return torch.sigmoid(self.edge_sharpness*level)
+        return self.fill(level)
 
     def super_ellipse(self,Wx,Wy,Cx,Cy,theta=0.,power=2.):
         '''
@@ -128,7 +143,7 @@ class geometry:
 
         self.grid()
         level = 1. - (torch.abs(((self.x_grid-Cx)*torch.cos(theta)+(self.y_grid-Cy)*torch.sin(theta))/(Wx/2.))**power + torch.abs((-(self.x_grid-Cx)*torch.sin(theta)+(self.y_grid-Cy)*torch.cos(theta))/(Wy/2.))**power)**(1/power)
-        return torch.sigmoid(self.edge_sharpness*level)
+        return self.fill(level)
 
     def hollow_square(self, W1, W2, Cx, Cy, theta=0.):
         layerA = self.square(W1, W1, Cx, Cy, theta)
@@ -143,8 +158,8 @@ class geometry:
         return torch.minimum(layerA,1.-layerB)
     
     def cross(self, Wx, Wy, Cx, Cy, theta):
-        layerA = self.rectangle(Wx=Wx, Wy=Wy, Cx=L[0]/2., Cy=L[1]/2., theta=theta)
-        layerB = self.rectangle(Wx=Wx, Wy=Wy, Cx=L[0]/2., Cy=L[1]/2., theta=theta+3.14159265359/2)
+        layerA = self.rectangle(Wx=Wx, Wy=Wy, Cx=Cx, Cy=Cy, theta=theta)
+        layerB = self.rectangle(Wx=Wx, Wy=Wy, Cx=Cx, Cy=Cy, theta=theta+3.14159265359/2)
         
         return torch.maximum(layerA,layerB)
         
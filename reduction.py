@@ -0,0 +1,109 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+
+REDUCE_OPS = ["max", "min", "mean", "ptp"]
+
+
+class ReductionEngine:
+    '''
+        Chunked max/min/mean/ptp projections over result dimensions
+
+        來源只需支援 shape 與 numpy 風格切片 (numpy array、h5py.Dataset、
+        PolarizationView)，沿第 0 維分塊讀取，每塊不超過 chunk_bytes，
+        所以可以對硬碟上的大型結果做投影。結果依
+        (kind, op, axes, channel) 快取，最多保留 max_entries 筆。
+
+        Phase ('phase' kind) 的 mean 使用圓周平均 (相位向量平均後取角度)。
+    '''
+    def __init__(self, chunk_bytes=64 << 20, max_entries=16):
+        self.chunk_bytes = chunk_bytes
+        self.max_entries = max_entries
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+
+    def reduce(self, source, axes, op, kind="amplitude", channel=None, cache_key=None):
+        """
+        source: 若 channel 不為 None，最後一維為 polarization，切片時固定為 channel
+        axes: 要投影掉的維度 (不含 polarization 維度)，結果保留為長度 1 (keepdims)
+        cache_key: 來源識別，None 表示不快取
+        """
+        axes = tuple(sorted(axes))
+        key = None if cache_key is None else (cache_key, kind, op, axes, channel)
+        if key is not None:
+            with self.lock:
+                if key in self.cache:
+                    self.cache.move_to_end(key)
+                    return self.cache[key]
+
+        result = self._reduce(source, axes, op, kind, channel)
+
+        if key is not None:
+            with self.lock:
+                self.cache[key] = result
+                while len(self.cache) > self.max_entries:
+                    self.cache.popitem(last=False)
+        return result
+
+    def _read(self, source, start, stop, ndim, channel):
+        index = (slice(start, stop),) + (slice(None),)*(ndim - 1)
+        if channel is not None:
+            index += (channel,)
+        return np.asarray(source[index])
+
+    def _reduce(self, source, axes, op, kind, channel):
+        if op not in REDUCE_OPS:
+            raise ValueError(f"reduction not recognized: {op}")
+        shape = tuple(source.shape[:-1]) if channel is not None else tuple(source.shape)
+        ndim = len(shape)
+        # 每次讀取的第 0 維長度
+        row_bytes = int(np.prod(shape[1:]))*8
+        step = max(1, self.chunk_bytes//max(row_bytes, 1))
+        circular = op == "mean" and kind == "phase"
+
+        partials = []
+        for start in range(0, shape[0], step):
+            block = self._read(source, start, min(start + step, shape[0]), ndim, channel)
+            partials.append(self._partial(block, axes, op, circular))
+            # 第 0 維要投影時，逐塊合併以維持固定記憶體
+            if 0 in axes and len(partials) == 2:
+                partials = [self._combine(partials, op, circular)]
+        if 0 in axes:
+            total = partials[0]
+        else:
+            total = tuple(np.concatenate([p[i] for p in partials], axis=0) for i in range(len(partials[0])))
+        return self._finalize(total, op, circular, int(np.prod([shape[a] for a in axes])))
+
+    @staticmethod
+    def _partial(block, axes, op, circular):
+        if op == "max":
+            return (np.max(block, axis=axes, keepdims=True),)
+        if op == "min":
+            return (np.min(block, axis=axes, keepdims=True),)
+        if op == "ptp":
+            return (np.max(block, axis=axes, keepdims=True), np.min(block, axis=axes, keepdims=True))
+        if circular:
+            return (np.sum(np.cos(block), axis=axes, keepdims=True),
+                    np.sum(np.sin(block), axis=axes, keepdims=True))
+        return (np.sum(block, axis=axes, keepdims=True, dtype=np.float64),)
+
+    @staticmethod
+    def _combine(partials, op, circular):
+        a, b = partials
+        if op == "max":
+            return (np.maximum(a[0], b[0]),)
+        if op == "min":
+            return (np.minimum(a[0], b[0]),)
+        if op == "ptp":
+            return (np.maximum(a[0], b[0]), np.minimum(a[1], b[1]))
+        return tuple(x + y for x, y in zip(a, b))
+
+    @staticmethod
+    def _finalize(total, op, circular, count):
+        if op in ("max", "min"):
+            return total[0]
+        if op == "ptp":
+            return total[0] - total[1]
+        if circular:
+            return np.arctan2(total[1], total[0])
+        return total[0]/count
@@ -0,0 +1,124 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import numpy as np
+
+# key 格式變更時遞增，舊的快取項目自然失效
+CACHE_VERSION = 1
+# 浮點參數先四捨五入再雜湊，np.linspace 產生的 500.00000000000006 與 500.0 視為同一點
+KEY_DECIMALS = 9
+
+
+def file_digest(filename, _memo={}):
+    """
+    材料檔內容的 sha1 (依檔案大小與修改時間記憶，檔案未變動時不重新讀取)。
+    """
+    stat = os.stat(filename)
+    memo_key = (os.path.abspath(filename), stat.st_size, stat.st_mtime_ns)
+    if memo_key not in _memo:
+        with open(filename, "rb") as f:
+            _memo[memo_key] = hashlib.sha1(f.read()).hexdigest()
+    return _memo[memo_key]
+
+
+def _normalize(value):
+    if hasattr(value, "detach"):
+        value = value.detach().cpu().numpy()
+    if isinstance(value, np.ndarray):
+        value = value.tolist()
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    if isinstance(value, (float, np.floating)):
+        return round(float(value), KEY_DECIMALS)
+    if isinstance(value, np.integer):
+        return int(value)
+    return value
+
+
+def point_key(**inputs):
+    """
+    以所有影響單一網格點結果的輸入計算 content hash。
+    """
+    inputs = {k: _normalize(v) for k, v in inputs.items()}
+    inputs["cache_version"] = CACHE_VERSION
+    text = json.dumps(inputs, sort_keys=True)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    '''
+        Persistent content-addressed cache of RCWA.forward outputs
+
+        以 sqlite 單一檔案儲存 (root/rcwa_cache.sqlite)，key 為 point_key 的 hash，
+        value 為 forward 八個輸出堆疊的 complex array。多個 process (job_server、
+        sweep_shard) 可同時使用同一個快取。總大小超過 max_bytes 時依最後使用時間淘汰
+        到 max_bytes 的 90%。
+    '''
+    def __init__(self, root, max_bytes=2 << 30):
+        os.makedirs(root, exist_ok=True)
+        self.filename = os.path.join(root, "rcwa_cache.sqlite")
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._inserts = 0
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.filename, timeout=30, check_same_thread=False)
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, dtype TEXT, shape TEXT, "
+                              "value BLOB, size INTEGER, last_access REAL)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS results_access ON results (last_access)")
+
+    def get(self, key):
+        """
+        回傳快取的 numpy array，沒有時回傳 None。
+        """
+        with self.lock:
+            row = self.conn.execute("SELECT dtype, shape, value FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            with self.conn:
+                self.conn.execute("UPDATE results SET last_access = ? WHERE key = ?", (time.time(), key))
+            self.hits += 1
+        dtype, shape, value = row
+        return np.frombuffer(bytearray(value), dtype=dtype).reshape(json.loads(shape))
+
+    def put(self, key, array):
+        array = np.ascontiguousarray(array)
+        with self.lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)",
+                              (key, array.dtype.str, json.dumps(array.shape), array.tobytes(), array.nbytes, time.time()))
+            self._inserts += 1
+            # 每 64 次寫入檢查一次總大小
+            if self._inserts % 64 == 1:
+                self._evict()
+
+    def _evict(self):
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        target = total - int(self.max_bytes*0.9)
+        freed = 0
+        keys = []
+        for key, size in self.conn.execute("SELECT key, size FROM results ORDER BY last_access"):
+            keys.append((key,))
+            freed += size
+            if freed >= target:
+                break
+        self.conn.executemany("DELETE FROM results WHERE key = ?", keys)
+
+    def size(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+
+    def clear(self):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM results")
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,91 @@
+from collections.abc import Mapping
+import numpy as np
+
+# 每個 chunk 的目標大小 (bytes)
+CHUNK_BYTES = 1 << 20
+
+
+def _require_h5py():
+    try:
+        import h5py
+    except ImportError:
+        raise ImportError("HDF5 result files require h5py (pip install h5py)")
+    return h5py
+
+
+def chunk_shape(shape, itemsize, target=CHUNK_BYTES):
+    """
+    平衡的 chunk 形狀：反覆將最大的維度減半直到小於 target，
+    讓沿任意兩個維度切 2D slice 時讀取的 chunk 數都差不多。
+    """
+    chunks = list(shape)
+    while np.prod(chunks)*itemsize > target and max(chunks) > 1:
+        d = int(np.argmax(chunks))
+        chunks[d] = (chunks[d] + 1)//2
+    return tuple(max(1, c) for c in chunks)
+
+
+def _to_numpy(value):
+    if hasattr(value, "detach"):
+        value = value.detach().cpu().numpy()
+    return np.asarray(value)
+
+
+def _write_group(group, data, compression):
+    for key, value in data.items():
+        key = str(key)
+        if isinstance(value, Mapping):
+            _write_group(group.create_group(key), value, compression)
+        elif value is None or isinstance(value, (str, bool, int, float, complex, np.generic)):
+            group.attrs[key] = "" if value is None else value
+        else:
+            array = _to_numpy(value)
+            if array.ndim >= 2:
+                group.create_dataset(key, data=array, chunks=chunk_shape(array.shape, array.itemsize),
+                                     compression=compression, shuffle=compression is not None)
+            else:
+                group.create_dataset(key, data=array)
+
+
+def save_h5(filename, data, compression="gzip"):
+    """
+    將巢狀 dict (例如 {"data_sheet": {...}} 或 get_Sparameter 的結果) 存成 HDF5。
+    dict -> group，純量/字串 -> attribute，1D array -> dataset，
+    2D 以上的 array/tensor -> chunked + compressed dataset。
+    """
+    h5py = _require_h5py()
+    with h5py.File(filename, "w") as f:
+        _write_group(f, data, compression)
+    print(f"HDF5 file save as :'{filename}'")
+
+
+def _read_group(group):
+    data = dict(group.attrs)
+    for key, value in group.items():
+        if hasattr(value, "keys"):
+            data[key] = _read_group(value)
+        elif value.ndim >= 2 and value.size*value.dtype.itemsize > CHUNK_BYTES:
+            # 大型張量維持 lazy，只在切片時讀取需要的 chunk
+            data[key] = value
+        else:
+            data[key] = value[()]
+    return data
+
+
+def load_h5(filename):
+    """
+    讀取 save_h5 寫出的檔案。座標軸、metadata 與小型 array 直接讀入，
+    大型張量回傳 h5py.Dataset (支援 shape 與 numpy 風格的切片)。
+    回傳 (data, file)；file 需保持開啟直到不再讀取資料。
+    """
+    h5py = _require_h5py()
+    f = h5py.File(filename, "r")
+    return _read_group(f), f
+
+
+def convert_npy_to_h5(npy_filename, h5_filename, compression="gzip"):
+    """
+    將舊的 pickled .npy 結果檔轉成 HDF5。
+    """
+    data = np.load(npy_filename, allow_pickle=True).item()
+    save_h5(h5_filename, data, compression)
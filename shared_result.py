@@ -0,0 +1,149 @@
+import os
+import json
+import shutil
+import tempfile
+import numpy as np
+
+from channels import ChannelSelection
+from jones import LINEAR_INDEX
+from polarization_cache import make_data_sheet
+
+CHANNELS = ["xx", "xy", "yx", "yy"]
+MANIFEST = "manifest.json"
+
+
+def default_root():
+    """
+    Linux 上使用 RAM 的 /dev/shm，其他系統使用暫存資料夾 (由 OS page cache 共用)。
+    """
+    if os.path.isdir("/dev/shm"):
+        return "/dev/shm/metaatom_shared"
+    return os.path.join(tempfile.gettempdir(), "metaatom_shared")
+
+
+class SharedResult:
+    '''
+        Memory-mapped sweep result shared between threads and local processes
+
+        每個 T/R 的 Jones 張量 [..., 2, 2] (或只選部分分量時的各分量) 是一個 np.memmap 檔，manifest.json 記錄
+        shape、dtype 與掃描 list。RCWA.get_Sparameter(shared=...) 直接把結果寫進
+        這些 buffer (CPU 時零複製)，DataVisualize 以 SharedResult.open 映射同一份
+        記憶體，不需 pickle、存檔、再讀回。圓偏振分量由 DataVisualize 需要時計算。
+    '''
+    def __init__(self, path, manifest, arrays, files=None):
+        self.path = path
+        self.manifest = manifest
+        self.arrays = arrays
+        # 實際的 memmap 檔 {port 或 (port, key): np.memmap}，arrays 中的分量可能是其 view
+        self.files = files if files is not None else dict(arrays)
+
+    @classmethod
+    def create(cls, name, shape, dtype, sweep, root=None, channels=None):
+        """
+        name: 結果名稱 (資料夾名稱)
+        shape: 每個張量的 shape (get_Sparameter 的輸出格式)
+        dtype: numpy complex dtype
+        sweep: {"shape_type", "wvln_list", ..., "var4_list", "orders_list"} 寫入 manifest
+        channels: 要配置的 [(port, 線偏振分量), ...]，未給定時為 T/R 全部
+                  port 的四個分量都需要時存成一個 [..., 2, 2] 的 Jones 檔 ({port}_jones.bin)
+        """
+        path = os.path.join(root or default_root(), name)
+        os.makedirs(path, exist_ok=True)
+        channels = [(port, key) for port in ("T", "R") for key in CHANNELS] if channels is None else list(channels)
+        jones = [port for port in ("T", "R") if all((port, key) in channels for key in CHANNELS)]
+        manifest = {"shape": list(shape), "dtype": np.dtype(dtype).str, "sweep": sweep, "complete": False,
+                    "channels": [list(c) for c in channels], "jones": jones}
+        shared = cls(path, manifest, *cls._map(path, manifest, "w+"))
+        shared._write_manifest()
+        return shared
+
+    @staticmethod
+    def _map(path, manifest, mode):
+        shape = tuple(manifest["shape"])
+        jones = manifest.get("jones", [])
+        arrays, files = {}, {}
+        for port in jones:
+            files[port] = np.memmap(os.path.join(path, f"{port}_jones.bin"), dtype=manifest["dtype"],
+                                    mode=mode, shape=shape + (2, 2))
+            arrays.update({(port, key): files[port][..., i, j] for key, (i, j) in LINEAR_INDEX.items()})
+        for port, key in manifest.get("channels", [(port, key) for port in ("T", "R") for key in CHANNELS]):
+            if port not in jones:
+                files[(port, key)] = arrays[(port, key)] = np.memmap(os.path.join(path, f"{port}_{key}.bin"),
+                                                                     dtype=manifest["dtype"], mode=mode, shape=shape)
+        return arrays, files
+
+    @classmethod
+    def for_sweep(cls, name, shape_type, wvln_list, period_list, thickness_list, inc_ang_list, azi_ang_list,
+                  var1_list, var2_list, var3_list, var4_list, orders_list, dtype=np.complex64, root=None, channels=None):
+        """
+        依 get_Sparameter 的掃描 list 建立對應 shape 的共享結果。
+        channels: 與 get_Sparameter 相同的 ChannelSelection 或 "channels" dict，只配置需要的分量。
+        dtype: 須與寫入的 RCWA 的 sim_dtype 相同 (complex64 / complex128)，get_Sparameter 會檢查。
+        """
+        selection = ChannelSelection.from_spec(channels)
+        orders_list = selection.select_orders(orders_list)
+        lists = {"wvln_list": wvln_list, "period_list": period_list, "thickness_list": thickness_list,
+                 "inc_ang_list": inc_ang_list, "azi_ang_list": azi_ang_list, "var1_list": var1_list,
+                 "var2_list": var2_list, "var3_list": var3_list, "var4_list": var4_list}
+        sweep = {"shape_type": shape_type, **{k: [float(x) for x in v] for k, v in lists.items()},
+                 "orders_list": [list(map(int, o)) for o in orders_list]}
+        shape = (len(orders_list),) + tuple(len(v) for v in lists.values()) + (len(orders_list),)
+        return cls.create(name, shape, dtype, sweep, root, selection.linear())
+
+    @classmethod
+    def open(cls, path, root=None, writable=False):
+        """
+        path: 結果資料夾、manifest.json 路徑或 create 時的名稱
+        """
+        if os.path.basename(path) == MANIFEST:
+            path = os.path.dirname(path)
+        if not os.path.isdir(path):
+            path = os.path.join(root or default_root(), path)
+        with open(os.path.join(path, MANIFEST), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        return cls(path, manifest, *cls._map(path, manifest, "r+" if writable else "r"))
+
+    @property
+    def dtype(self):
+        return np.dtype(self.manifest["dtype"])
+
+    def _write_manifest(self):
+        tmp = os.path.join(self.path, MANIFEST + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, indent=2)
+        os.replace(tmp, os.path.join(self.path, MANIFEST))
+
+    def mark_complete(self):
+        for array in self.files.values():
+            array.flush()
+        self.manifest["complete"] = True
+        self._write_manifest()
+
+    def tensor(self, port, key):
+        """
+        以 torch tensor 包裝共享 buffer (共用記憶體，不複製)。
+        """
+        import torch
+        return torch.from_numpy(self.arrays[(port, key)])
+
+    def jones(self, port):
+        """
+        port 的 [..., 2, 2] Jones buffer (四個線偏振分量都有配置時)。
+        """
+        import torch
+        return torch.from_numpy(self.files[port])
+
+    def data_sheet(self, port="T", order_index=0):
+        """
+        組成 DataVisualize 可直接使用的 data_sheet (jones 指向共享 buffer)。
+        """
+        sweep = self.manifest["sweep"]
+        var_lists = [sweep[f"var{i}_list"] for i in range(1, 5)]
+        jones = {key: self.arrays[(port, key)] for key in CHANNELS if (port, key) in self.arrays}
+        return make_data_sheet(sweep["shape_type"], sweep["wvln_list"], sweep["period_list"],
+                               sweep["thickness_list"], var_lists, jones, order_index)
+
+    def unlink(self):
+        self.arrays = {}
+        self.files = {}
+        shutil.rmtree(self.path, ignore_errors=True)
@@ -0,0 +1,167 @@
+import numpy as np
+import torch
+
+# get_Sparameter 結果張量的掃描維度順序 (orders 之後)
+AXIS_NAMES = ["wavelength", "period", "thickness", "inc_ang", "azi_ang", "var1", "var2", "var3", "var4"]
+
+
+def sweep_samples(tensor, axes):
+    """
+    將 get_Sparameter 的單一結果張量攤平成 (座標, 數值) 樣本。
+
+    Return
+    - points: (N, D) float64 array，D 為長度 > 1 的掃描維度
+    - values: (N, orders) complex array
+    - names: 各欄位對應的 AXIS_NAMES
+    """
+    t = torch.as_tensor(tensor).detach().cpu()
+    if t.dim() == len(AXIS_NAMES) + 2:
+        t = t[0]
+    free_dims = [d for d, a in enumerate(axes) if len(a) > 1]
+    grids = np.meshgrid(*[np.asarray(axes[d], dtype=float) for d in free_dims], indexing='ij')
+    points = np.stack([g.ravel() for g in grids], axis=1) if free_dims else np.zeros((1, 0))
+    values = t.reshape(-1, t.shape[-1]).numpy()
+    return points, values, [AXIS_NAMES[d] for d in free_dims]
+
+class GridSurrogate:
+    '''
+        Multilinear surrogate over a completed get_Sparameter sweep
+
+        由 RCWA.get_Sparameter 的結果建立，可在掃描網格內任意 (wavelength,
+        period, thickness, inc_ang, azi_ang, var1..var4) 位置內插複數 T/R。
+        只有一個取樣點的維度視為固定值，查詢時不需提供。
+
+        Parameters
+        - result: get_Sparameter 回傳的 {'T': {...}, 'R': {...}}
+        - axes: 掃描用的 list，順序同 AXIS_NAMES (wvln_list, period_list, ...)
+        - mode: 'polar' 對 |t| 線性內插、相位在單位圓上做加權平均 (不受 2π 折返影響)
+                'complex' 直接對實部/虛部線性內插
+        - chunk_size: 每批處理的查詢點數，限制暫存記憶體
+
+        Keyword Parameters
+        - dtype / device: 內插運算使用的 torch dtype 與 device
+    '''
+    def __init__(self, result, axes, mode='polar', chunk_size=1 << 18, *,
+                 dtype=torch.float64, device=torch.device('cpu')):
+        if len(axes) != len(AXIS_NAMES):
+            raise ValueError(f"expected {len(AXIS_NAMES)} axes ({', '.join(AXIS_NAMES)}), got {len(axes)}")
+        if mode not in ('polar', 'complex'):
+            raise ValueError(f"mode not recognized: {mode}")
+        self.mode = mode
+        self.chunk_size = chunk_size
+        self.dtype = dtype
+        self.cdtype = torch.complex128 if dtype is torch.float64 else torch.complex64
+        self.device = device
+
+        self.grid_shape = [len(a) for a in axes]
+        # 只內插長度 > 1 的維度
+        self.free_dims = [d for d, n in enumerate(self.grid_shape) if n > 1]
+        self.axis_names = [AXIS_NAMES[d] for d in self.free_dims]
+        self.fixed = {AXIS_NAMES[d]: float(axes[d][0]) for d, n in enumerate(self.grid_shape) if n == 1}
+
+        # 各維度排序後的座標，以及還原到原張量位置的排序索引
+        self.axes = []
+        self._order = []
+        for d in self.free_dims:
+            a = np.asarray(axes[d], dtype=float)
+            order = np.argsort(a)
+            if np.any(np.diff(a[order]) <= 0):
+                raise ValueError(f"axis {AXIS_NAMES[d]} has duplicated values")
+            self.axes.append(torch.as_tensor(a[order], dtype=dtype, device=device))
+            self._order.append(order)
+
+        strides = []
+        stride = 1
+        for d in reversed(self.free_dims):
+            strides.append(stride)
+            stride *= self.grid_shape[d]
+        self.strides = torch.tensor(strides[::-1], dtype=torch.long, device=device)
+
+        self.values = {}
+        for port, channels in result.items():
+            for key, tensor in channels.items():
+                self.values[(port, key)] = self._prepare(tensor)
+
+    def _prepare(self, tensor):
+        t = torch.as_tensor(tensor).detach()
+        if t.dim() == len(AXIS_NAMES) + 2:
+            # get_Sparameter 的結果前後各有一個 orders 維度，兩者內容相同
+            t = t[0]
+        # [grid..., orders]，依排序後的座標重新排列並攤平
+        n_orders = t.shape[-1]
+        t = t.reshape(self.grid_shape + [n_orders])
+        for d, order in zip(self.free_dims, self._order):
+            t = t.index_select(d, torch.as_tensor(order, device=t.device))
+        t = t.reshape(-1, n_orders).to(device=self.device, dtype=self.cdtype)
+        if self.mode == 'polar':
+            return torch.abs(t).to(self.dtype), torch.sgn(t)
+        return (t,)
+
+    def _locate(self, points):
+        """
+        回傳每個查詢點在各維度的左側索引與線性權重。
+        """
+        idx = []
+        frac = []
+        for k, axis in enumerate(self.axes):
+            q = points[:, k].contiguous()
+            if torch.any(q < axis[0]) or torch.any(q > axis[-1]):
+                raise ValueError(f"{self.axis_names[k]} query outside grid [{axis[0].item()}, {axis[-1].item()}]")
+            i = torch.clamp(torch.searchsorted(axis, q, right=True) - 1, 0, len(axis) - 2)
+            f = (q - axis[i])/(axis[i + 1] - axis[i])
+            idx.append(i)
+            frac.append(f)
+        return idx, frac
+
+    def _interpolate(self, arrays, points):
+        idx, frac = self._locate(points)
+        n_dims = len(self.axes)
+        out = [torch.zeros(points.shape[0], a.shape[-1], dtype=a.dtype, device=self.device) for a in arrays]
+        # 逐一累加 2^D 個角點
+        for corner in range(1 << n_dims):
+            flat = torch.zeros(points.shape[0], dtype=torch.long, device=self.device)
+            weight = torch.ones(points.shape[0], dtype=self.dtype, device=self.device)
+            for k in range(n_dims):
+                bit = (corner >> k) & 1
+                flat += (idx[k] + bit)*self.strides[k]
+                weight = weight*(frac[k] if bit else 1. - frac[k])
+            for o, a in zip(out, arrays):
+                o += weight[:, None]*a[flat]
+        return out
+
+    def to_points(self, query):
+        """
+        將 {axis name: array} 或 (N, D) array 轉成 (N, D) tensor，
+        D 依照 self.axis_names 的順序。
+        """
+        if isinstance(query, dict):
+            for name, value in self.fixed.items():
+                if name in query and not np.allclose(np.asarray(query[name]), value):
+                    raise ValueError(f"{name} is fixed at {value} in this sweep")
+            columns = [torch.as_tensor(np.asarray(query[name], dtype=float).ravel()) for name in self.axis_names]
+            points = torch.stack(columns, dim=1) if columns else torch.zeros(1, 0)
+        else:
+            points = torch.as_tensor(np.asarray(query, dtype=float))
+            if points.dim() == 1:
+                points = points[None, :]
+        if points.shape[1] != len(self.axis_names):
+            raise ValueError(f"query needs {len(self.axis_names)} columns ({', '.join(self.axis_names)})")
+        return points.to(device=self.device, dtype=self.dtype)
+
+    def __call__(self, query, port='T', polarization='xx'):
+        """
+        query: {axis name: array} 或 (N, D) array
+        回傳 complex tensor，shape 為 [N, orders]。
+        """
+        arrays = self.values[(port, polarization)]
+        points = self.to_points(query)
+        results = []
+        for start in range(0, points.shape[0], self.chunk_size):
+            chunk = points[start:start + self.chunk_size]
+            out = self._interpolate(arrays, chunk)
+            if self.mode == 'polar':
+                amp, phasor = out
+                results.append(amp*torch.exp(1j*torch.angle(phasor)))
+            else:
+                results.append(out[0])
+        return torch.cat(results, dim=0)
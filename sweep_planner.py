@@ -0,0 +1,115 @@
+import itertools
+import numpy as np
+
+from surrogate import AXIS_NAMES
+
+# 每個計算階段依賴的掃描維度
+SESSION_DEPS = {"wavelength", "period", "inc_ang", "azi_ang"}
+MODE_DEPS = SESSION_DEPS | {"var1", "var2", "var3", "var4"}
+ALL_DEPS = set(AXIS_NAMES)
+# 在所有階段相依性相同的維度類別 (session 維度、幾何變數、thickness)
+AXIS_CLASSES = [[a for a in AXIS_NAMES if a in SESSION_DEPS],
+                [a for a in AXIS_NAMES if a in MODE_DEPS - SESSION_DEPS],
+                [a for a in AXIS_NAMES if a not in MODE_DEPS]]
+# 相對成本 (harmonic order 5 CPU profile，以單點完整求解約為 2 計)
+STAGE_WEIGHTS = {"session": 0.1, "modes": 0.45, "layer": 0.85, "combine": 0.55}
+
+
+def entry_bytes(harmonic_order, complex_bytes=8):
+    """
+    StackSolver 快取一筆資料的大小 (modes, layer)，N = (2*order+1)^2 個 Fourier 項。
+    """
+    N = (2*harmonic_order + 1)**2
+    return 14*N*N*complex_bytes, 50*N*N*complex_bytes
+
+
+def stage_count(order, sizes, deps, capacity, pollution=False):
+    """
+    以 order (外到內) 執行 sweep 時，依賴 deps 的階段實際需要計算幾次。
+
+    每個不在 deps 內的迴圈，若其內層所有 deps 維度的組合數 (working set) 不超過
+    capacity，該迴圈前進時可以重用快取，否則要重新計算。
+    pollution=True 表示每個網格點都會插入一筆新的快取 (swept 層)，working set 以內層所有點計算。
+    """
+    count = int(np.prod([sizes[a] for a in order if a in deps]))
+    for p, axis in enumerate(order):
+        if axis in deps or sizes[axis] == 1:
+            continue
+        inner = order[p + 1:]
+        working = np.prod([sizes[a] for a in inner if a in deps])
+        if pollution:
+            working = working + np.prod([sizes[a] for a in inner])
+        if working > capacity:
+            count *= sizes[axis]
+    return count
+
+
+class SweepPlan:
+    '''
+        Loop order chosen for a get_Sparameter sweep and its expected reuse
+
+        - order: 由外到內的 AXIS_NAMES (傳給 get_Sparameter(loop_order=...))
+        - stages: {階段名稱: 計算次數}
+        - cost / default_cost / naive_cost: 相對成本 (最佳順序 / 原本固定順序 / 完全不重用)
+    '''
+    def __init__(self, order, stages, cost, default_stages, default_cost, naive_cost, points, memory_bytes):
+        self.order = order
+        self.stages = stages
+        self.cost = cost
+        self.default_stages = default_stages
+        self.default_cost = default_cost
+        self.naive_cost = naive_cost
+        self.points = points
+        self.memory_bytes = memory_bytes
+
+    def report(self):
+        lines = [f"sweep plan: {self.points} points, cache budget {self.memory_bytes/(1 << 20):.0f} MB",
+                 f"  loop order (outer -> inner): {', '.join(self.order)}"]
+        for name, count in self.stages.items():
+            lines.append(f"  {name:>12s}: {count} solves (fixed order {self.default_stages[name]}, no reuse {self.points})")
+        lines.append(f"  expected cost vs fixed order: {self.cost/self.default_cost:.1%} "
+                     f"({1 - self.cost/self.default_cost:.1%} saved), vs no reuse: {self.cost/self.naive_cost:.1%}")
+        return "\n".join(lines)
+
+
+def plan_sweep(axes, harmonic_order, n_static_layers=0, memory_bytes=1 << 30, max_sessions=64, complex_bytes=8):
+    """
+    axes: get_Sparameter 的 9 個掃描 list (順序同 AXIS_NAMES)
+    n_static_layers: stack 中不隨 sweep 改變的層數
+    memory_bytes: StackSolver 快取總預算 (modes 與 layer 快取各一半)
+
+    成本只取決於各維度相對於相依類別的位置，所以只列舉類別的順序 (最多 3! 種)，
+    類別內的維度依長度排序 (遞增或遞減各試一次)；長度 1 的維度放在最外層。
+    """
+    sizes = {name: len(a) for name, a in zip(AXIS_NAMES, axes)}
+    points = int(np.prod(list(sizes.values())))
+    mode_bytes, layer_bytes = entry_bytes(harmonic_order, complex_bytes)
+    mode_capacity = (memory_bytes//2)//mode_bytes
+    layer_capacity = (memory_bytes//2)//layer_bytes
+
+    def evaluate(order):
+        stages = {"session": stage_count(order, sizes, SESSION_DEPS, max_sessions),
+                  "modes": stage_count(order, sizes, MODE_DEPS, mode_capacity),
+                  "layer": points, "combine": points}
+        cost = sum(STAGE_WEIGHTS[name]*count for name, count in stages.items())
+        if n_static_layers:
+            # 不變的層每個 session 只需計算一次，但與 swept 層共用 layer 快取
+            stages["static layers"] = n_static_layers*stage_count(order, sizes, SESSION_DEPS, layer_capacity, pollution=True)
+            cost += (STAGE_WEIGHTS["modes"] + STAGE_WEIGHTS["layer"])*stages["static layers"]
+        return stages, cost
+
+    fixed = [a for a in AXIS_NAMES if sizes[a] == 1]
+    classes = [[a for a in group if sizes[a] > 1] for group in AXIS_CLASSES]
+    classes = [group for group in classes if group]
+    best = None
+    for class_order in itertools.permutations(classes):
+        for descending in itertools.product((False, True), repeat=len(class_order)):
+            order = fixed + [a for group, d in zip(class_order, descending)
+                             for a in sorted(group, key=lambda a: sizes[a], reverse=d)]
+            stages, cost = evaluate(order)
+            if best is None or cost < best[2]:
+                best = (order, stages, cost)
+    default_stages, default_cost = evaluate(list(AXIS_NAMES))
+    naive_cost = points*(sum(STAGE_WEIGHTS.values()) + n_static_layers*(STAGE_WEIGHTS["modes"] + STAGE_WEIGHTS["layer"]))
+    order, stages, cost = best
+    return SweepPlan(order, stages, cost, default_stages, default_cost, naive_cost, points, memory_bytes)
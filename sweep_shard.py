@@ -0,0 +1,242 @@
+import os
+import sys
+import glob
+import json
+import time
+import hashlib
+import argparse
+import yaml
+import numpy as np
+import torch
+from result_store import save_h5
+from channels import ChannelSelection, LINEAR
+from jones import JonesTensor, stack_linear
+
+# get_Sparameter 的掃描 list 名稱 (依迴圈順序)
+SWEEP_KEYS = ["wvln_list", "period_list", "thickness_list", "inc_ang_list", "azi_ang_list",
+              "var1_list", "var2_list", "var3_list", "var4_list"]
+# GUI 欄位 -> 掃描 list (min / max / points 欄位前綴, 單點欄位)
+GUI_SWEEP_FIELDS = {
+    "wvln_list": ("Wavelength", "Wavelength"),
+    "period_list": ("Period", "Period"),
+    "thickness_list": ("Thickness", "Thickness"),
+    "inc_ang_list": ("Incident", "Incident angle"),
+    "azi_ang_list": ("Azimuth", "Azimuth angle"),
+    "var1_list": ("Parameter1", "Parameter1"),
+    "var2_list": ("Parameter2", "Parameter2"),
+    "var3_list": ("Theta", "Theta"),
+    "var4_list": ("Parameter3", None),
+}
+CHANNELS = [("T", "xx"), ("T", "xy"), ("T", "yx"), ("T", "yy"),
+            ("R", "xx"), ("R", "xy"), ("R", "yx"), ("R", "yy")]
+# RCWA 需要的參數 (會影響結果的部分)
+RCWA_ARGS = ["Device", "Data Type", "Random Seed", "Shape type", "Harmonic order", "Input material",
+             "Output material", "Layer 1 material A", "Layer 1 material B", "Stack", "Grid pixels"]
+
+
+def _gui_axis(args, prefix, single):
+    points = args.get(f"{prefix} points", "")
+    if isinstance(points, (int, float)) and points > 0:
+        return np.linspace(float(args[f"{prefix} min"]), float(args[f"{prefix} max"]), int(points)).tolist()
+    if single is not None and isinstance(args.get(single), (int, float)):
+        return [float(args[single])]
+    return [0.]
+
+
+def spec_from_args(args, orders_list=None, channels=None):
+    """
+    由 GUI 的 args (MainWieget.get_gui_parameter) 建立 sweep spec。
+    channels: 選用的輸出選擇 (channels.ChannelSelection 的 dict 格式)，未給定時為完整輸出。
+    """
+    spec = {"args": {key: args[key] for key in RCWA_ARGS if key in args}}
+    for key, (prefix, single) in GUI_SWEEP_FIELDS.items():
+        spec[key] = _gui_axis(args, prefix, single)
+    spec["orders_list"] = orders_list if orders_list is not None else [[0, 0]]
+    if channels is not None:
+        spec["channels"] = ChannelSelection.from_spec(channels).to_spec()
+    return spec
+
+
+def spec_hash(spec):
+    text = json.dumps(spec, sort_keys=True, default=float)
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+def save_spec(spec, filename):
+    with open(filename, "w", encoding="utf-8") as f:
+        yaml.safe_dump(spec, f, allow_unicode=True)
+
+
+def load_spec(filename):
+    with open(filename, "r", encoding="utf-8") as f:
+        return yaml.safe_load(f)
+
+
+def grid_shape(spec):
+    return tuple(len(spec[key]) for key in SWEEP_KEYS)
+
+
+def shard_indices(spec, shard, num_shards):
+    """
+    第 shard 個 (0-based) shard 負責的攤平索引，切成 num_shards 段連續區間。
+    相同 spec 與 num_shards 在任何節點上都得到相同的分割。
+    """
+    if not 0 <= shard < num_shards:
+        raise ValueError(f"shard must be in [0, {num_shards}), got {shard}")
+    total = int(np.prod(grid_shape(spec)))
+    bounds = np.linspace(0, total, num_shards + 1).round().astype(np.int64)
+    return np.arange(bounds[shard], bounds[shard + 1], dtype=np.int64)
+
+
+def _shard_prefix(spec, shard, num_shards):
+    return f"shard_{spec_hash(spec)}_{shard:04d}_of_{num_shards:04d}"
+
+
+def _write_part(filename, indices, values):
+    # 先寫暫存檔再 rename，NFS 上其他節點不會讀到寫一半的檔案
+    tmp = f"{filename}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        np.savez(f, indices=np.asarray(indices, dtype=np.int64),
+                 **{f"{port}_{pol}": np.stack(array) for (port, pol), array in values.items()})
+    os.replace(tmp, filename)
+
+
+def _done_indices(out_dir, prefix):
+    done = set()
+    for part in glob.glob(os.path.join(out_dir, f"{prefix}_part*.npz")):
+        with np.load(part) as data:
+            done.update(data["indices"].tolist())
+    return done
+
+
+def run_shard(spec, shard, num_shards, out_dir, flush_every=100):
+    """
+    計算單一 shard，每 flush_every 個點寫出一個 part 檔。
+    重新執行時會略過已寫出的點，所以節點中斷後可直接重跑同一個 shard。
+    """
+    from RCWA import RCWA
+    os.makedirs(out_dir, exist_ok=True)
+    prefix = _shard_prefix(spec, shard, num_shards)
+    spec_file = os.path.join(out_dir, f"spec_{spec_hash(spec)}.yaml")
+    if not os.path.exists(spec_file):
+        save_spec(spec, spec_file)
+
+    indices = shard_indices(spec, shard, num_shards)
+    done = _done_indices(out_dir, prefix)
+    todo = [i for i in indices.tolist() if i not in done]
+    part = len(glob.glob(os.path.join(out_dir, f"{prefix}_part*.npz")))
+    print(f"shard {shard}/{num_shards}: {len(indices)} points, {len(indices) - len(todo)} already done")
+
+    # thread 數由啟動此 shard 的 process 決定 (CLI 的 --threads、job server 的 worker)
+    rcwa = RCWA(dict(spec["args"], **{"Auto tune": "off"}))
+    shape = grid_shape(spec)
+    axes = [spec[key] for key in SWEEP_KEYS]
+    selection = ChannelSelection.from_spec(spec.get("channels"))
+    orders_list = selection.select_orders(spec["orders_list"])
+    extract = selection.linear()
+    batch, values = [], {c: [] for c in extract}
+    start = time.time()
+    for n, flat in enumerate(todo):
+        point = [axes[d][i] for d, i in enumerate(np.unravel_index(flat, shape))]
+        outputs = rcwa.forward(*point, orders_list, extract)
+        for c, out in zip(CHANNELS, outputs):
+            if c in values:
+                values[c].append(out.detach().cpu().numpy())
+        batch.append(flat)
+        if len(batch) >= flush_every or n == len(todo) - 1:
+            _write_part(os.path.join(out_dir, f"{prefix}_part{part:05d}.npz"), batch, values)
+            part += 1
+            batch, values = [], {c: [] for c in extract}
+            print(f"shard {shard}/{num_shards}: {n + 1}/{len(todo)} points, {time.time() - start:.1f} s")
+    return len(todo)
+
+
+def merge_shards(spec, out_dir, allow_duplicates=False):
+    """
+    合併 out_dir 內屬於此 spec 的所有 part 檔，組成與 get_Sparameter 相同格式的結果。
+    檢查覆蓋率 (缺點會 raise) 與重複點 (預設 raise)。
+    """
+    shape = grid_shape(spec)
+    total = int(np.prod(shape))
+    selection = ChannelSelection.from_spec(spec.get("channels"))
+    n_orders = len(selection.select_orders(spec["orders_list"]))
+    parts = sorted(glob.glob(os.path.join(out_dir, f"shard_{spec_hash(spec)}_*_part*.npz")))
+    if not parts:
+        raise FileNotFoundError(f"no shard files for spec {spec_hash(spec)} in {out_dir}")
+
+    count = np.zeros(total, dtype=np.int32)
+    flat_values = {}
+    for part in parts:
+        with np.load(part) as data:
+            indices = data["indices"]
+            for port, pol in selection.linear():
+                array = data[f"{port}_{pol}"]
+                if (port, pol) not in flat_values:
+                    flat_values[(port, pol)] = np.zeros((total, n_orders), dtype=array.dtype)
+                flat_values[(port, pol)][indices] = array
+            np.add.at(count, indices, 1)
+
+    duplicated = np.flatnonzero(count > 1)
+    if len(duplicated) and not allow_duplicates:
+        raise ValueError(f"{len(duplicated)} grid points computed more than once (e.g. flat index {duplicated[:5].tolist()}); "
+                         "shards were run with different num_shards?")
+    missing = np.flatnonzero(count == 0)
+    if len(missing):
+        raise ValueError(f"{len(missing)}/{total} grid points missing (e.g. flat index {missing[:5].tolist()})")
+
+    # [orders, wvln, pd, thk, inc, azi, var1, var2, var3, var4, orders]，與 get_Sparameter 一致
+    tensors = {}
+    for (port, pol), array in flat_values.items():
+        grid = torch.as_tensor(array.reshape(shape + (n_orders,)))
+        tensors[(port, pol)] = grid.unsqueeze(0).expand((n_orders,) + tuple(grid.shape))
+    result = {}
+    for port in selection.ports:
+        if all((port, pol) in tensors for pol in LINEAR):
+            # 四個分量直接組成 [..., 2, 2] Jones 張量 (只複製一次)
+            result[port] = JonesTensor(stack_linear(*(tensors[(port, pol)] for pol in LINEAR)), keys=selection.polarizations)
+        else:
+            result[port] = {pol: tensors[(port, pol)].clone() for pol in selection.polarizations}
+    print(f"merged {len(parts)} part files, {total} grid points")
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Distributed RCWA sweep sharding on a shared filesystem")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run = sub.add_parser("run", help="compute one shard")
+    run.add_argument("spec")
+    run.add_argument("--shard", type=int, required=True)
+    run.add_argument("--num-shards", type=int, required=True)
+    run.add_argument("--out", required=True)
+    run.add_argument("--flush-every", type=int, default=100)
+    run.add_argument("--threads", type=int, default=None,
+                     help="torch threads (default: autotune result for this host, else torch default)")
+    merge = sub.add_parser("merge", help="merge shard files into the full result")
+    merge.add_argument("spec")
+    merge.add_argument("--out", required=True)
+    merge.add_argument("--save", required=True, help="output .h5 or .npy file")
+    merge.add_argument("--allow-duplicates", action="store_true")
+    opts = parser.parse_args(argv)
+
+    spec = load_spec(opts.spec)
+    if opts.command == "run":
+        threads = opts.threads
+        if threads is None:
+            from autotune import cached_setting
+            setting = cached_setting(spec["args"]["Harmonic order"], spec["args"].get("Data Type", "float32"))
+            threads = setting and setting["threads"]
+        if threads:
+            torch.set_num_threads(threads)
+        run_shard(spec, opts.shard, opts.num_shards, opts.out, opts.flush_every)
+    else:
+        result = merge_shards(spec, opts.out, opts.allow_duplicates)
+        result = {port: {k: v.numpy() for k, v in channels.items()} for port, channels in result.items()}
+        if opts.save.lower().endswith((".h5", ".hdf5")):
+            save_h5(opts.save, {"result": result, "spec": spec})
+        else:
+            np.save(opts.save, {"result": result, "spec": spec}, allow_pickle=True)
+            print(f"result save as :'{opts.save}'")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
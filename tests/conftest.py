@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 模組位於 repo 根目錄 (沒有 package)，測試時從根目錄匯入
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,48 @@
+import os
+import signal
+import time
+
+import job_server
+from job_server import JobQueue
+
+
+def _fake_execute(spec, job_dir):
+    # 代替完整 sweep 的 job：hang=True 時記錄 pid 後等待被測試砍掉
+    if spec.get("hang"):
+        with open(os.path.join(job_dir, "pid"), "w") as f:
+            f.write(str(os.getpid()))
+        time.sleep(60)
+    filename = os.path.join(job_dir, "result.npy")
+    with open(filename, "wb") as f:
+        f.write(b"done")
+    return filename
+
+
+def _wait(queue, job_id, timeout=60.):
+    start = time.time()
+    while time.time() - start < timeout:
+        job = queue.status(job_id)
+        if job["status"] in ("done", "failed", "cancelled"):
+            return job
+        time.sleep(0.1)
+    raise TimeoutError(f"job {job_id} still {job['status']}")
+
+
+def test_job_after_worker_crash_completes(tmp_path, monkeypatch):
+    monkeypatch.setattr(job_server, "_execute_job", _fake_execute)
+    queue = JobQueue(str(tmp_path), workers=1, threads=1)
+    try:
+        crashed = queue.submit({"hang": True})
+        pid_file = tmp_path/crashed["id"]/"pid"
+        start = time.time()
+        while not pid_file.exists():
+            assert time.time() - start < 60, "worker never started"
+            time.sleep(0.1)
+        os.kill(int(pid_file.read_text()), signal.SIGKILL)
+        assert _wait(queue, crashed["id"])["status"] == "failed"
+
+        job = queue.submit({"hang": False})
+        finished = _wait(queue, job["id"])
+        assert finished["status"] == "done", finished["error"]
+    finally:
+        queue.shutdown()
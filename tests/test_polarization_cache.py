@@ -0,0 +1,47 @@
+import numpy as np
+import torch
+
+import jones
+from jones import JonesTensor
+from polarization_cache import PolarizationCache, POLARIZATION_CHANNELS
+
+# get_Sparameter 的輸出格式 [orders, wvln, pd, thk, inc, azi, var1..var4, orders] + [2, 2]
+SHAPE = (2, 40, 3, 2, 1, 1, 5, 1, 1, 1, 2)
+
+
+def _tensor():
+    generator = torch.Generator().manual_seed(0)
+    real, imag = torch.randn((2,) + SHAPE + (2, 2), generator=generator, dtype=torch.float64)
+    return JonesTensor(torch.complex(real, imag))
+
+
+def test_chunked_matches_unchunked_on_jones_tensor():
+    tensor = _tensor()
+    full = PolarizationCache(tensor, "ellipse", chunk_bytes=1 << 30)
+    chunked = PolarizationCache(tensor, "ellipse", chunk_bytes=1)
+    for channel in range(len(POLARIZATION_CHANNELS)):
+        for kind in ("amplitude", "phase"):
+            np.testing.assert_allclose(chunked.get(channel, kind), full.get(channel, kind), rtol=1e-12, atol=1e-12)
+
+
+def test_chunked_circular_matches_mapping_access():
+    tensor = _tensor()
+    cache = PolarizationCache(tensor, "ellipse", chunk_bytes=1)
+    channel = [key for _, key in POLARIZATION_CHANNELS].index("RL")
+    expected = np.abs(tensor["RL"][tuple(cache.index)].numpy())**2
+    np.testing.assert_allclose(cache.get(channel, "amplitude"), expected, rtol=1e-12)
+
+
+def test_circular_component_only_on_slices(monkeypatch):
+    tensor = _tensor()
+    sizes = []
+    component = jones.component
+
+    def recording(data, out_state, in_state):
+        sizes.append(data.numel())
+        return component(data, out_state, in_state)
+
+    monkeypatch.setattr(jones, "component", recording)
+    cache = PolarizationCache(tensor, "ellipse", chunk_bytes=1)
+    cache.get([key for _, key in POLARIZATION_CHANNELS].index("RL"), "amplitude")
+    assert sizes and max(sizes) < tensor.data.numel() // SHAPE[1]
@@ -4,6 +4,7 @@ import pandas as pd
 from openpyxl import load_workbook, Workbook
 from openpyxl.chart import ScatterChart, Reference, Series
 from openpyxl.formatting.rule import ColorScaleRule
+from openpyxl.utils import get_column_letter
 from mpl_toolkits.axes_grid1 import make_axes_locatable
 
 def list_material(material_dir="Materials_data"):
@@ -77,40 +78,66 @@ def read_excel_orders(file_name, sheet_name="Orders"):
 
     return xtar_order_list, ytar_order_list
 
-def save_diffraction_intensity_to_excel(Diffracive_Intensity, filename="Diffracive_Intensity_with_axes.xlsx"):
+EXCEL_MAX_ROWS = 1048576
+EXCEL_MAX_COLS = 16384
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("Parquet export requires pyarrow (pip install pyarrow)")
+    return pyarrow, pyarrow.parquet
+
+def _intensity_axes(Nx, Ny):
+    # 以陣列中心為 0 的 X (欄)、Y (列) 座標
+    return np.arange(Ny) - Ny // 2, np.arange(Nx) - Nx // 2
+
+def export_diffraction_intensity(Diffracive_Intensity, filename="Diffracive_Intensity_with_axes.xlsx", chunk_rows=1024):
     """
-    Save an N x N numpy array to an Excel file with X and Y axes and apply color scale formatting.
+    Save an N x N numpy array with X and Y axes, format chosen by the file extension:
+    .xlsx (write-only 串流，加上 color scale 格式)、.csv 或 .parquet；大型陣列建議使用 .csv / .parquet。
 
     Parameters:
         Diffracive_Intensity (np.ndarray): N x N numpy array containing intensity values.
-        filename (str): Name of the Excel file to save. Default is 'Diffracive_Intensity_with_axes.xlsx'.
+        filename (str): Name of the file to save. Default is 'Diffracive_Intensity_with_axes.xlsx'.
+        chunk_rows (int): 每次轉換成 Python 數值後寫出的列數 (.parquet 為每個 row group 的列數)。
     """
+    Diffracive_Intensity = np.asarray(Diffracive_Intensity)
     Nx = Diffracive_Intensity.shape[0]
     Ny = Diffracive_Intensity.shape[1]
-    """ if Diffracive_Intensity.shape[0] != Diffracive_Intensity.shape[1]:
-        raise ValueError("Diffracive_Intensity must be a square matrix (N x N).") """
-
-    # Create Excel workbook and sheet
-    workbook = Workbook()
-    sheet = workbook.active
-    sheet.title = "Intensity Data"
-
-    # Calculate center for axes
-    cx = Nx // 2
-    cy = Ny // 2
-
-    # Write X-axis labels (1st row, starting from 2nd column)
-    for j in range(1, Ny + 1):
-        sheet.cell(row=1, column=j + 1, value=j -1 - cy)
-
-    # Write Y-axis labels (1st column, starting from 2nd row)
-    for i in range(1, Nx + 1):
-        sheet.cell(row=i + 1, column=1, value=i -1 - cx)
-
-    # Write intensity data (starting from B2)
-    for i in range(Nx):
-        for j in range(Ny):
-            sheet.cell(row=i + 2, column=j + 2, value=Diffracive_Intensity[i, j])
+    x_axis, y_axis = _intensity_axes(Nx, Ny)
+    ext = os.path.splitext(filename)[1].lower()
+
+    if ext == ".csv":
+        with open(filename, "w", encoding="utf-8", newline="") as f:
+            f.write("," + ",".join(map(str, x_axis)) + "\n")
+            for start in range(0, Nx, chunk_rows):
+                block = Diffracive_Intensity[start:start + chunk_rows]
+                np.savetxt(f, np.column_stack([y_axis[start:start + len(block)], block]), delimiter=",", fmt="%.9g")
+        print(f"CSV file save as :'{filename}'")
+        return
+
+    if ext == ".parquet":
+        pa, pq = _require_pyarrow()
+        schema = pa.schema([("Y", pa.int64())] + [(str(x), pa.from_numpy_dtype(Diffracive_Intensity.dtype))
+                                                  for x in x_axis])
+        # 每 chunk_rows 列寫成一個 row group，不建立完整的 DataFrame
+        with pq.ParquetWriter(filename, schema) as writer:
+            for start in range(0, Nx, chunk_rows):
+                block = Diffracive_Intensity[start:start + chunk_rows]
+                columns = [pa.array(y_axis[start:start + len(block)], type=pa.int64())]
+                columns += [pa.array(block[:, j]) for j in range(Ny)]
+                writer.write_table(pa.Table.from_arrays(columns, schema=schema))
+        print(f"Parquet file save as :'{filename}'")
+        return
+
+    if Nx + 1 > EXCEL_MAX_ROWS or Ny + 1 > EXCEL_MAX_COLS:
+        raise ValueError(f"{Nx} x {Ny} exceeds the Excel sheet size limit, save as .csv or .parquet instead")
+
+    # write-only 模式逐列串流寫出，不在記憶體中保留所有 cell 物件
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Intensity Data")
 
     # Apply color scale formatting
     color_scale_rule = ColorScaleRule(
@@ -118,16 +145,27 @@ def save_diffraction_intensity_to_excel(Diffracive_Intensity, filename="Diffraci
         mid_type="percentile", mid_value=5, mid_color="FFFF00",  # Mid value: Yellow
         end_type="max", end_color="00FF00"  # Max value: Green
     )
+    # 格式範圍依資料大小決定 (B2 起)
+    range_end = f"{get_column_letter(Ny + 1)}{Nx + 1}"
+    sheet.conditional_formatting.add(f"B2:{range_end}", color_scale_rule)
 
-    # Define data range dynamically and apply formatting
-    range_start = "B2"
-    range_end = "TT1069"
-    sheet.conditional_formatting.add(f"{range_start}:{range_end}", color_scale_rule)
+    # X-axis labels (1st row), Y-axis labels (1st column)
+    sheet.append([None] + x_axis.tolist())
+    for start in range(0, Nx, chunk_rows):
+        rows = Diffracive_Intensity[start:start + chunk_rows].tolist()
+        for y, row in zip(y_axis[start:start + len(rows)].tolist(), rows):
+            sheet.append([y] + row)
 
     # Save the workbook
     workbook.save(filename)
     print(f"Excel file save as :'{filename}'")
 
+def save_diffraction_intensity_to_excel(Diffracive_Intensity, filename="Diffracive_Intensity_with_axes.xlsx", chunk_rows=1024):
+    """
+    舊名稱，保留相容性；同 export_diffraction_intensity。
+    """
+    export_diffraction_intensity(Diffracive_Intensity, filename, chunk_rows)
+
 def createfolder(save_dir, folder_name):
     base_dir = os.path.join(save_dir, folder_name)  # 基礎資料夾名稱
     new_dir = base_dir